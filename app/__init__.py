@@ -2,18 +2,17 @@ import os
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
-from flask_bcrypt import Bcrypt
 from dotenv import load_dotenv
 from datetime import datetime, timezone
+from app.replica import RoutingSession
 
-# Initialize extensions
-db = SQLAlchemy()
+# Initialize extensions; the session can send read-only work to a replica (app/replica.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 login_manager = LoginManager()
-bcrypt = Bcrypt()
 login_manager.login_view = 'auth.login'
 
 def create_app():
-    # Create and configure the app
+    # Create and configure the app. Keep this cheap: every worker and CLI call runs it
     app = Flask(__name__)
     
     # Load environment variables
@@ -23,11 +22,97 @@ def create_app():
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-key-for-testing')
     app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///scom_portal.db')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Optional read replica for read-only requests, and how long a browser
+    # reads the primary after it writes so it sees its own changes
+    app.config['DATABASE_REPLICA_URL'] = os.getenv('DATABASE_REPLICA_URL', '')
+    app.config['REPLICA_STICKY_SECONDS'] = int(os.getenv('REPLICA_STICKY_SECONDS', 10))
+    # Seconds between background order-expiry runs; 0 leaves it to `flask orders expire`
+    app.config['ORDER_EXPIRY_INTERVAL'] = int(os.getenv('ORDER_EXPIRY_INTERVAL', 0))
+    # Seconds a logged-in user's identity is served from memory before re-reading it
+    app.config['USER_CACHE_TTL'] = int(os.getenv('USER_CACHE_TTL', 60))
+    # Seconds between checks for plan changes made by other processes
+    app.config['PLAN_CATALOG_CHECK'] = int(os.getenv('PLAN_CATALOG_CHECK', 30))
+    # Dashboard/listing cache: in-process unless CACHE_URL names a Redis server
+    app.config['CACHE_URL'] = os.getenv('CACHE_URL', '')
+    app.config['CACHE_TTL'] = int(os.getenv('CACHE_TTL', 60))
+    app.config['CACHE_SIZE'] = int(os.getenv('CACHE_SIZE', 1024))
+    # Password hashing: werkzeug method string and how many hashes may run/wait at once
+    app.config['PASSWORD_HASH_METHOD'] = os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+    app.config['PASSWORD_HASH_QUEUE'] = int(os.getenv('PASSWORD_HASH_QUEUE', 16))
+    # JSON API: bearer token lifetime and the largest order batch accepted
+    app.config['API_TOKEN_MAX_AGE'] = int(os.getenv('API_TOKEN_MAX_AGE', 30 * 24 * 3600))
+    app.config['API_MAX_BATCH'] = int(os.getenv('API_MAX_BATCH', 1000))
+    # Background jobs: where their files go, attempts per job and worker timings (seconds)
+    app.config['JOBS_DIR'] = os.getenv('JOBS_DIR') or os.path.join(app.instance_path, 'jobs')
+    app.config['JOB_MAX_ATTEMPTS'] = int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+    app.config['JOB_RETRY_DELAY'] = int(os.getenv('JOB_RETRY_DELAY', 30))
+    app.config['JOB_POLL_INTERVAL'] = float(os.getenv('JOB_POLL_INTERVAL', 1))
+    app.config['JOB_STALE_AFTER'] = int(os.getenv('JOB_STALE_AFTER', 120))
+    # Connection pool for server databases (SQLite ignores these)
+    app.config['DB_POOL_SIZE'] = int(os.getenv('DB_POOL_SIZE', 10))
+    app.config['DB_MAX_OVERFLOW'] = int(os.getenv('DB_MAX_OVERFLOW', 20))
+    app.config['DB_POOL_TIMEOUT'] = int(os.getenv('DB_POOL_TIMEOUT', 30))
+    app.config['DB_POOL_RECYCLE'] = int(os.getenv('DB_POOL_RECYCLE', 1800))
+    app.config['DB_QUERY_CACHE_SIZE'] = int(os.getenv('DB_QUERY_CACHE_SIZE', 1200))
+    # Request instrumentation: per-request JSON log line and the slow-statement threshold
+    app.config['PERF_LOG'] = os.getenv('PERF_LOG', '1') == '1'
+    app.config['SLOW_QUERY_MS'] = int(os.getenv('SLOW_QUERY_MS', 100))
+    
+    # Engine profile: pool sizing for server databases, pragmas for SQLite
+    from app import engine
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine.engine_options(app.config)
+    from app import replica
+    app.config['SQLALCHEMY_BINDS'] = replica.engine_binds(app.config)
     
     # Initialize extensions with app
     db.init_app(app)
+    engine.init_app(app)
     login_manager.init_app(app)
-    bcrypt.init_app(app)
+    
+    # Route read-only requests to the replica, if there is one
+    replica.init_app(app)
+    
+    # Count SQL statements and time rendering for every request
+    from app import instrumentation
+    instrumentation.init_app(app)
+    
+    # Hash and verify passwords on a bounded worker pool
+    from app import passwords
+    passwords.init_app(app)
+    
+    # Keep the dashboard counters in step with session writes
+    from app import counters
+    counters.init_app(app)
+    
+    # ... and the daily revenue/subscription rollups
+    from app import rollups
+    rollups.init_app(app)
+    
+    # Cache user identities for the login loader
+    from app import identity
+    identity.init_app(app)
+    
+    # Serve subscription plans from memory
+    from app import catalog
+    catalog.init_app(app)
+    
+    # Cache dashboard fragments and query results until a write touches them
+    from app import cache
+    cache.init_app(app)
+    
+    # ETags for the listing and export pages
+    from app import conditional
+    conditional.init_app(app)
+    
+    # Start the background order-expiry thread if configured
+    if app.config['ORDER_EXPIRY_INTERVAL'] > 0:
+        from app.expiry import start_scheduler
+        start_scheduler(app, app.config['ORDER_EXPIRY_INTERVAL'])
+    
+    # Register CLI commands
+    from app.commands import register_commands
+    register_commands(app)
     
     # Add template context processor
     @app.context_processor
@@ -47,24 +132,8 @@ def create_app():
     from app.seller import bp as seller_blueprint
     app.register_blueprint(seller_blueprint, url_prefix='/seller')
     
-    # Create database tables
-    with app.app_context():
-        from . import models
-        db.create_all()
-        
-        # Create default admin user if not exists
-        from .models import User
-        from werkzeug.security import generate_password_hash
-        
-        admin = User.query.filter_by(username='admin').first()
-        if not admin:
-            admin = User(
-                username='admin',
-                email='admin@example.com',
-                password_hash=generate_password_hash(os.getenv('DEFAULT_ADMIN_PASSWORD', 'admin123')),
-                role='admin'
-            )
-            db.session.add(admin)
-            db.session.commit()
+    from app.api import bp as api_blueprint
+    app.register_blueprint(api_blueprint, url_prefix='/api/v1')
     
+    # No database I/O here: schema and seed data come from `flask bootstrap`
     return app
@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+from flask_wtf import FlaskForm
+from flask_wtf.file import FileField, FileRequired
+from wtforms import StringField, IntegerField, SelectField, BooleanField, DateField
+from wtforms.validators import Optional, NumberRange, ValidationError
+from app import db
+from app.catalog import get_plan
+from app.exporter import FORMATS
+from app.models import User
+from app.queries import ORDER_STATUSES
+
+REPORT_MONTHS = (6, 12, 24)
+RENEWAL_MAX_DAYS = 365
+
+def _check_seller(field):
+    if not db.session.query(User.id).filter_by(id=field.data, role='seller').first():
+        raise ValidationError('Unknown seller.')
+
+class ActionForm(FlaskForm):
+    # A button-only POST (reset, cancel): nothing to submit but the CSRF token
+    pass
+
+class ImportCustomersForm(FlaskForm):
+    file = FileField('CSV File', validators=[FileRequired('Please choose a CSV file to import.')])
+    seller = IntegerField('Default Seller', validators=[Optional()])
+
+    def validate_seller(self, seller):
+        _check_seller(seller)
+
+# Background jobs queued from the admin pages; each form's params() are the job's params
+
+class ExportOrdersJobForm(FlaskForm):
+    # The listing's filter arguments, under the names the listing uses
+    format = SelectField('Format', choices=list(FORMATS), default='csv')
+    status = SelectField('Status', choices=[''] + list(ORDER_STATUSES), default='')
+    seller = IntegerField('Seller', validators=[Optional()])
+    start_date = DateField('From Date', validators=[Optional()])
+    end_date = DateField('To Date', validators=[Optional()])
+
+    def params(self):
+        filters = {'status': self.status.data, 'seller': self.seller.data,
+                   'start_date': self.start_date.data and self.start_date.data.isoformat(),
+                   'end_date': self.end_date.data and self.end_date.data.isoformat()}
+        return {'fmt': self.format.data, 'filters': {key: value for key, value in filters.items() if value}}
+
+class ExportCustomersJobForm(FlaskForm):
+    format = SelectField('Format', choices=list(FORMATS), default='csv')
+    search = StringField('Search')
+    seller = IntegerField('Seller', validators=[Optional()])
+
+    def params(self):
+        return {'fmt': self.format.data, 'search': (self.search.data or '').strip(),
+                'seller_id': self.seller.data}
+
+class RenewOrdersJobForm(FlaskForm):
+    days = IntegerField('Days', default=7, validators=[NumberRange(min=1, max=RENEWAL_MAX_DAYS)])
+    seller_id = IntegerField('Seller', validators=[Optional()])
+    dry_run = BooleanField('Dry run')
+
+    def validate_seller_id(self, seller_id):
+        _check_seller(seller_id)
+
+    def params(self):
+        # The window is fixed now, not when a worker gets to the job
+        start = datetime.utcnow().date()
+        return {'window_start': start.isoformat(),
+                'window_end': (start + timedelta(days=self.days.data)).isoformat(),
+                'seller_id': self.seller_id.data, 'dry_run': self.dry_run.data}
+
+class ReportOrdersJobForm(FlaskForm):
+    seller_id = IntegerField('Seller', validators=[Optional()])
+    plan_id = IntegerField('Plan', validators=[Optional()])
+    months = SelectField('Months', coerce=int, choices=REPORT_MONTHS, default=REPORT_MONTHS[1])
+
+    def validate_seller_id(self, seller_id):
+        _check_seller(seller_id)
+
+    def validate_plan_id(self, plan_id):
+        if get_plan(plan_id.data) is None:
+            raise ValidationError('Unknown plan.')
+
+    def params(self):
+        return {'seller_id': self.seller_id.data, 'plan_id': self.plan_id.data, 'months': self.months.data}
+
+JOB_FORMS = {
+    'export_orders': ExportOrdersJobForm,
+    'export_customers': ExportCustomersJobForm,
+    'renew_orders': RenewOrdersJobForm,
+    'report_orders': ReportOrdersJobForm,
+}
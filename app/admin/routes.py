@@ -1,46 +1,51 @@
-from flask import render_template, redirect, url_for, flash, request
+from flask import (render_template, redirect, url_for, flash, request, jsonify, Response,
+                   stream_with_context, abort, current_app, send_from_directory)
 from flask_login import login_required, current_user, login_user, logout_user
-from app import db, bcrypt
-from app.models import User, Customer, Order, SubscriptionPlan
+from markupsafe import Markup
+from app import db, counters, exporter, instrumentation, jobs, rollups
+from app.cache import cache, ADMIN
+from app.models import User, Customer, Order, SubscriptionPlan, Job
+from app.catalog import all_plans
 from . import bp
 from app.decorators import admin_required
+from app.conditional import conditional
+from app.replica import primary_reads
 from app.auth.forms import RegistrationForm
+from app.admin.forms import ActionForm, ImportCustomersForm, JOB_FORMS, REPORT_MONTHS
+from app.queries import (order_filters_from_args, admin_order_listing, order_listing_version,
+                         keyset_page, order_status_counts, customer_listing, customer_listing_version)
+
+ORDERS_PER_PAGE = 25
+JOBS_PER_PAGE = 50
 
 @bp.route('/dashboard')
 @login_required
 @admin_required
 def dashboard():
-    # Get counts for the admin dashboard
-    total_sellers = User.query.filter_by(role='seller').count()
-    total_customers = Customer.query.count()
-    total_orders = Order.query.count()
-    
-    # Get recent orders with related data
-    recent_orders_query = db.session.query(
-        Order,
-        Customer.name.label('customer_name'),
-        User.username.label('seller_username'),
-        SubscriptionPlan.name.label('plan_name')
-    )
-    recent_orders_query = recent_orders_query.join(Customer, Order.customer_id == Customer.id)
-    recent_orders_query = recent_orders_query.join(User, Customer.seller_id == User.id)
-    recent_orders_query = recent_orders_query.join(SubscriptionPlan, Order.plan_id == SubscriptionPlan.id)
-    recent_orders_result = recent_orders_query.order_by(Order.created_at.desc()).limit(5).all()
-    
-    # Convert Row objects to dictionaries for easier template access
-    recent_orders = [{
-        'order': order[0],
-        'customer_name': order[1],
-        'seller_username': order[2],
-        'plan_name': order[3]
-    } for order in recent_orders_result]
+    # Counts and the recent-orders table are cached until a seller, customer or order changes
+    counts = cache.get_or_set(ADMIN, 'admin.dashboard.counts', lambda: counters.get_counts(
+        [counters.SELLERS, counters.CUSTOMERS, counters.ORDERS]))
+    total_sellers = counts[counters.SELLERS]
+    total_customers = counts[counters.CUSTOMERS]
+    total_orders = counts[counters.ORDERS]
+    
+    recent_orders = cache.get_or_set(ADMIN, 'admin.dashboard.recent_orders', lambda: Markup(render_template(
+        'admin/_recent_orders.html',
+        recent_orders=admin_order_listing().order_by(Order.created_at.desc()).limit(5).all())))
+    
+    # Twelve-month trends from the daily rollups, not the orders table
+    analytics = cache.get_or_set(ADMIN, 'admin.dashboard.analytics', lambda: Markup(render_template(
+        'admin/_analytics.html',
+        trend=rollups.trend(),
+        breakdown=rollups.revenue_breakdown())))
     
     return render_template('admin/dashboard.html',
                          title='Admin Dashboard',
                          total_sellers=total_sellers,
                          total_customers=total_customers,
                          total_orders=total_orders,
-                         recent_orders=recent_orders)
+                         recent_orders=recent_orders,
+                         analytics=analytics)
 
 @bp.route('/sellers')
 @login_required
@@ -64,14 +69,12 @@ def sellers():
 def add_seller():
     form = RegistrationForm()
     if form.validate_on_submit():
-        hashed_password = bcrypt.generate_password_hash(form.password.data).decode('utf-8')
         user = User(
             username=form.username.data,
             email=form.email.data,
-            password=hashed_password,
-            role='seller',
-            is_approved=True
+            role='seller'
         )
+        user.set_password(form.password.data)
         db.session.add(user)
         db.session.commit()
         flash(f'New seller account created for {form.username.data}!', 'success')
@@ -81,48 +84,252 @@ def add_seller():
                          form=form,
                          legend='Add New Seller')
 
+def _customer_scope():
+    return request.args.get('search', '').strip(), request.args.get('seller', type=int)
+
 @bp.route('/customers')
 @login_required
 @admin_required
+@conditional(lambda: customer_listing_version(*_customer_scope()))
 def customers():
-    all_customers = db.session.query(
-        Customer, 
-        User.username.label('seller_username')
-    ).join(
-        User, Customer.seller_id == User.id
-    ).all()
+    page = request.args.get('page', 1, type=int)
+    per_page = 25  # Number of customers per page
+    search = request.args.get('search', '').strip()
+    seller_id = request.args.get('seller', type=int)
+    
+    # Get paginated customers with seller name and order count
+    pagination = customer_listing(search=search, seller_id=seller_id).paginate(
+        page=page, per_page=per_page, error_out=False)
+    
+    # Get all sellers for the filter dropdown
+    all_sellers = User.query.filter_by(role='seller').order_by(User.username).all()
+    
+    # Filter arguments without the page number, for building page links
+    filter_args = {key: value for key, value in request.args.items() if key != 'page' and value}
+    
     return render_template('admin/customers.html', 
                          title='All Customers', 
-                         customers=all_customers)
+                         customers=pagination.items,
+                         pagination=pagination,
+                         filter_args=filter_args,
+                         all_sellers=all_sellers,
+                         import_form=ImportCustomersForm(),
+                         csrf_form=ActionForm())
+
+def _form_error(form):
+    # The first validation message, for a flash
+    return next(iter(form.errors.values()))[0]
+
+@bp.route('/customers/import', methods=['POST'])
+@login_required
+@admin_required
+def import_customers():
+    form = ImportCustomersForm()
+    if not form.validate_on_submit():
+        flash(_form_error(form), 'danger')
+        return redirect(url_for('admin.customers'))
+    
+    # Saved to disk and imported by a background worker; the job keeps the report
+    job = jobs.enqueue('import_customers', {'upload': jobs.save_upload(form.file.data),
+                                            'seller_id': form.seller.data},
+                       created_by=current_user.id)
+    return _job_queued(job)
+
+@bp.route('/customers/import/template')
+@login_required
+@admin_required
+def import_template():
+    from app.importer import CSV_COLUMNS
+    return Response(','.join(CSV_COLUMNS) + '\r\n', mimetype='text/csv',
+                    headers={'Content-Disposition': 'attachment; filename=customers_template.csv'})
+
+@bp.route('/customers/export')
+@login_required
+@admin_required
+@conditional(lambda: customer_listing_version(*_customer_scope()))
+def export_customers():
+    fmt = request.args.get('format', 'csv')
+    if fmt not in exporter.FORMATS:
+        abort(400)
+    search, seller_id = _customer_scope()
+    rows = exporter.customer_rows(search=search, seller_id=seller_id)
+    return _stream_export('customers', fmt, exporter.CUSTOMER_FIELDS, rows)
+
+@bp.route('/orders/export')
+@login_required
+@admin_required
+@conditional(lambda: order_listing_version(order_filters_from_args(request.args)))
+def export_orders():
+    fmt = request.args.get('format', 'csv')
+    if fmt not in exporter.FORMATS:
+        abort(400)
+    rows = exporter.order_rows(order_filters_from_args(request.args))
+    return _stream_export('orders', fmt, exporter.ORDER_FIELDS, rows)
+
+def _stream_export(name, fmt, fields, rows):
+    # stream_with_context keeps the request (and DB session) alive while streaming
+    body = stream_with_context(exporter.iter_export(fmt, fields, rows))
+    return Response(body, mimetype=exporter.FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename={exporter.filename(name, fmt)}'})
 
 @bp.route('/orders')
 @login_required
 @admin_required
+@conditional(lambda: order_listing_version(order_filters_from_args(request.args)))
 def orders():
-    # Query orders with related data
-    query = db.session.query(
-        Order,
-        Customer.name.label('customer_name'),
-        User.username.label('seller_username'),
-        SubscriptionPlan.name.label('plan_name')
-    )
-    query = query.join(Customer, Order.customer_id == Customer.id)
-    query = query.join(User, Customer.seller_id == User.id)
-    query = query.join(SubscriptionPlan, Order.plan_id == SubscriptionPlan.id)
-    all_orders = query.order_by(Order.created_at.desc()).all()
-    
-    # Convert Row objects to dictionaries for easier template access
-    orders_data = [{
-        'order': order[0],
-        'customer_name': order[1],
-        'seller_username': order[2],
-        'plan_name': order[3]
-    } for order in all_orders]
+    filters = order_filters_from_args(request.args)
+    cursor = request.args.get('cursor')
+    
+    # Query one keyset page of orders with related data
+    page_rows, next_cursor = keyset_page(admin_order_listing(filters), cursor=cursor,
+                                         per_page=ORDERS_PER_PAGE)
+    
+    # Summary cards come from one grouped COUNT instead of the page contents
+    status_counts = cache.get_or_set(ADMIN, 'admin.orders.status_counts',
+                                     lambda: order_status_counts(filters), params=filters)
+    if filters['status']:
+        total_orders = status_counts.get(filters['status'], 0)
+    else:
+        total_orders = sum(status_counts.values())
     
     # Get all sellers for the filter dropdown
-    all_sellers = User.query.filter_by(role='seller').all()
+    all_sellers = User.query.filter_by(role='seller').order_by(User.username).all()
+    
+    # Filter arguments without the cursor, for building page links
+    filter_args = {key: value for key, value in request.args.items() if key != 'cursor' and value}
     
     return render_template('admin/orders.html',
                          title='Manage Orders',
-                         orders=orders_data,
-                         all_sellers=all_sellers)
+                         orders=page_rows,
+                         status_counts=status_counts,
+                         total_orders=total_orders,
+                         next_cursor=next_cursor,
+                         is_first_page=not cursor,
+                         filter_args=filter_args,
+                         all_sellers=all_sellers,
+                         csrf_form=ActionForm())
+
+@bp.route('/perf')
+@login_required
+@admin_required
+def perf():
+    # Request timings recorded in this process since start-up (or the last reset)
+    return render_template('admin/perf.html',
+                         title='Performance',
+                         endpoints=instrumentation.recorder.summary(),
+                         slow_statements=instrumentation.recorder.slow_statements(),
+                         slow_query_ms=current_app.config['SLOW_QUERY_MS'],
+                         cache_metrics=cache.metrics(),
+                         cache_backend=cache.backend.describe(),
+                         reset_form=ActionForm())
+
+@bp.route('/reports')
+@login_required
+@admin_required
+def reports():
+    from app.reports import cached_report, DEFAULT_MONTHS
+    
+    seller_id = request.args.get('seller_id', type=int)
+    plan_id = request.args.get('plan_id', type=int)
+    months = request.args.get('months', DEFAULT_MONTHS, type=int)
+    if months not in REPORT_MONTHS:
+        months = DEFAULT_MONTHS
+    
+    report = cached_report(seller_id=seller_id, plan_id=plan_id, months=months)
+    sellers = db.session.query(User.id, User.username).filter_by(role='seller').order_by(User.username).all()
+    return render_template('admin/reports.html',
+                         title='Reports',
+                         report=report,
+                         sellers=sellers,
+                         plans=all_plans(),
+                         seller_id=seller_id,
+                         plan_id=plan_id,
+                         months=months,
+                         month_choices=REPORT_MONTHS,
+                         csrf_form=ActionForm())
+
+def _job_queued(job):
+    # 202 with the job for API-style callers, else back to the job list
+    if request.args.get('format') == 'json':
+        return jsonify(jobs.job_dict(job)), 202, {'Location': url_for('admin.job_status', job_id=job.id)}
+    flash(f'Job #{job.id} queued. Progress and results appear below.', 'info')
+    return redirect(url_for('admin.job_queue'))
+
+@bp.route('/jobs')
+@login_required
+@admin_required
+@primary_reads
+def job_queue():
+    job_list = Job.query.order_by(Job.id.desc()).limit(JOBS_PER_PAGE).all()
+    sellers = db.session.query(User.id, User.username).filter_by(role='seller').order_by(User.username).all()
+    return render_template('admin/jobs.html',
+                         title='Background Jobs',
+                         jobs=job_list,
+                         metrics=jobs.metrics(),
+                         active=any(job.status in (jobs.QUEUED, jobs.RUNNING) for job in job_list),
+                         sellers=sellers,
+                         month_choices=REPORT_MONTHS,
+                         csrf_form=ActionForm())
+
+@bp.route('/jobs', methods=['POST'])
+@login_required
+@admin_required
+def enqueue_job():
+    kind = request.form.get('kind')
+    if kind not in JOB_FORMS:
+        abort(400)
+    form = JOB_FORMS[kind]()
+    if not form.validate_on_submit():
+        flash(_form_error(form), 'danger')
+        return redirect(url_for('admin.job_queue'))
+    job = jobs.enqueue(kind, form.params(), created_by=current_user.id)
+    return _job_queued(job)
+
+@bp.route('/jobs/<int:job_id>')
+@login_required
+@admin_required
+@primary_reads
+def job_status(job_id):
+    # Polled for progress; never cached
+    response = jsonify(jobs.job_dict(db.get_or_404(Job, job_id)))
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@bp.route('/jobs/<int:job_id>/cancel', methods=['POST'])
+@login_required
+@admin_required
+def cancel_job(job_id):
+    form = ActionForm()
+    if not form.validate_on_submit():
+        flash(_form_error(form), 'danger')
+    elif jobs.cancel(job_id):
+        flash(f'Cancelling job #{job_id}.', 'info')
+    else:
+        flash(f'Job #{job_id} has already finished.', 'warning')
+    return redirect(url_for('admin.job_queue'))
+
+@bp.route('/jobs/<int:job_id>/download')
+@login_required
+@admin_required
+@primary_reads
+def download_job(job_id):
+    job = db.get_or_404(Job, job_id)
+    if job.status != jobs.SUCCEEDED or not (job.result or {}).get('file'):
+        abort(404)
+    name = job.result['file']
+    prefix = f'job-{job.id}-'
+    return send_from_directory(jobs.jobs_dir(), name, as_attachment=True,
+                               download_name=name[len(prefix):] if name.startswith(prefix) else name)
+
+@bp.route('/perf/reset', methods=['POST'])
+@login_required
+@admin_required
+def reset_perf():
+    form = ActionForm()
+    if not form.validate_on_submit():
+        flash(_form_error(form), 'danger')
+        return redirect(url_for('admin.perf'))
+    instrumentation.recorder.reset()
+    cache.reset_metrics()
+    flash('Performance samples cleared.', 'success')
+    return redirect(url_for('admin.perf'))
@@ -0,0 +1,7 @@
+from flask import Blueprint
+
+# Create API blueprint
+bp = Blueprint('api', __name__)
+
+# Import routes at the bottom to avoid circular imports
+from . import routes
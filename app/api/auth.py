@@ -0,0 +1,56 @@
+"""Bearer tokens for the JSON API.
+
+Tokens are signed with SECRET_KEY and carry only the user id, so checking one
+needs no database lookup beyond the cached identity. They expire after
+API_TOKEN_MAX_AGE seconds; deleting the user (or changing SECRET_KEY) revokes
+them sooner.
+"""
+from functools import wraps
+from flask import current_app, g, jsonify, request
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+from app.identity import load_identity
+
+DEFAULT_MAX_AGE = 30 * 24 * 3600
+
+
+def _serializer():
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt='api-token')
+
+
+def issue_token(user_id):
+    return _serializer().dumps({'user': user_id})
+
+
+def read_token(token):
+    """Return the token's user id, or None for a bad or expired token"""
+    max_age = current_app.config.get('API_TOKEN_MAX_AGE', DEFAULT_MAX_AGE)
+    try:
+        return _serializer().loads(token, max_age=max_age)['user']
+    except (SignatureExpired, BadSignature, KeyError, TypeError):
+        return None
+
+
+def error(status, message):
+    response = jsonify({'error': message})
+    response.status_code = status
+    return response
+
+
+def token_required(role=None):
+    """Authenticate the request from its Bearer token into `g.api_user`"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+            user_id = read_token(token.strip()) if scheme.lower() == 'bearer' else None
+            identity = load_identity(user_id) if user_id is not None else None
+            if identity is None:
+                response = error(401, 'A valid bearer token is required')
+                response.headers['WWW-Authenticate'] = 'Bearer'
+                return response
+            if role and identity.role != role:
+                return error(403, f'This endpoint is for {role}s')
+            g.api_user = identity
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
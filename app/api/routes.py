@@ -0,0 +1,120 @@
+from flask import current_app, g, jsonify, request
+from werkzeug.exceptions import HTTPException
+from app import db
+from app.api import bp
+from app.api.auth import error, issue_token, token_required
+from app.catalog import all_plans, get_plan
+from app.models import Customer, User
+from app.order_batch import create_orders
+from app.queries import (order_filters_from_args, apply_order_filters, apply_customer_filters,
+                         seller_order_listing, keyset_page)
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def _plan_name(plan_id):
+    # A plan deleted from the catalog leaves its orders without a name
+    plan = get_plan(plan_id)
+    return plan.name if plan else None
+
+
+def _limit():
+    return max(1, min(request.args.get('limit', DEFAULT_LIMIT, type=int), MAX_LIMIT))
+
+
+@bp.app_errorhandler(HTTPException)
+def http_error(e):
+    # JSON instead of the HTML error pages for everything under /api, including
+    # unknown URLs and methods, which never reach the blueprint itself
+    if not request.path.startswith('/api/'):
+        return e
+    return error(e.code, e.description)
+
+
+@bp.route('/tokens', methods=['POST'])
+def create_token():
+    data = request.get_json(silent=True) or {}
+    email, password = data.get('email'), data.get('password')
+    if not isinstance(email, str) or not isinstance(password, str):
+        return error(400, 'email and password are required')
+    user = User.query.filter_by(email=email).first()
+    if user is None or not user.check_password(password):
+        return error(401, 'Invalid email or password')
+    if db.session.is_modified(user):
+        # check_password upgraded an outdated hash
+        db.session.commit()
+    return jsonify({'token': issue_token(user.id),
+                    'expires_in': current_app.config['API_TOKEN_MAX_AGE']}), 201
+
+
+@bp.route('/plans')
+@token_required()
+def plans():
+    return jsonify({'plans': [{
+        'id': plan.id,
+        'name': plan.name,
+        'description': plan.description,
+        'price': plan.price,
+        'duration_days': plan.duration_days,
+    } for plan in all_plans()]})
+
+
+@bp.route('/customers')
+@token_required('seller')
+def customers():
+    # Keyset pagination on id: pass the returned `next` back as `after`
+    query = db.session.query(Customer.id, Customer.name, Customer.email, Customer.phone, Customer.address)
+    query = apply_customer_filters(query, request.args.get('search', '').strip(), g.api_user.id)
+    after = request.args.get('after', type=int)
+    if after:
+        query = query.filter(Customer.id > after)
+    limit = _limit()
+    rows = query.order_by(None).order_by(Customer.id).limit(limit + 1).all()
+
+    next_after = rows[limit - 1].id if len(rows) > limit else None
+    return jsonify({'customers': [row._asdict() for row in rows[:limit]], 'next': next_after})
+
+
+@bp.route('/orders')
+@token_required('seller')
+def orders():
+    filters = order_filters_from_args(request.args)
+    filters['seller_id'] = None  # always the token's seller
+    query = apply_order_filters(seller_order_listing(g.api_user.id), **filters)
+    rows, next_cursor = keyset_page(query, cursor=request.args.get('cursor'), per_page=_limit())
+    return jsonify({
+        'orders': [{
+            'id': row.id,
+            'customer_id': row.customer_id,
+            'customer': row.customer_name,
+            'plan': _plan_name(row.plan_id),
+            'status': row.status,
+            'start_date': _iso(row.start_date),
+            'end_date': _iso(row.end_date),
+            'created_at': _iso(row.created_at),
+        } for row in rows],
+        'next': next_cursor,
+    })
+
+
+@bp.route('/orders', methods=['POST'])
+@token_required('seller')
+def create_order_batch():
+    """Create a batch of orders: {"orders": [{customer_id, plan_id, start_date?, status?}, ...]}"""
+    data = request.get_json(silent=True)
+    items = data.get('orders') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return error(400, 'Expected a JSON object with a non-empty "orders" list')
+    max_batch = current_app.config['API_MAX_BATCH']
+    if len(items) > max_batch:
+        return error(413, f'At most {max_batch} orders per request')
+
+    results, created = create_orders(g.api_user.id, items, all_or_nothing=bool(data.get('all_or_nothing')))
+    # 201 when everything was created, 207 for a partial batch, 422 for none
+    status = 201 if created == len(items) else 207 if created else 422
+    return jsonify({'created': created, 'failed': len(items) - created, 'results': results}), status
@@ -14,6 +14,9 @@ def login():
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data).first()
         if user and user.check_password(form.password.data):
+            if db.session.is_modified(user):
+                # check_password upgraded an outdated hash
+                db.session.commit()
             login_user(user, remember=form.remember.data)
             next_page = request.args.get('next')
             if user.role == 'admin':
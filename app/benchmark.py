@@ -0,0 +1,171 @@
+"""Route benchmarks through the Flask test client.
+
+Each scenario is requested `iterations` times after a warm-up request. For
+every scenario the harness records latency percentiles and the number of SQL
+statements per request (read from the Server-Timing header that
+app/instrumentation.py adds). GET routes are timed twice: cold, with the
+page cache (app/cache.py) cleared before every request so the numbers show
+what the queries cost, and warm, as "<route> (warm)". `run()` returns a JSON-ready dict that also
+notes the data volume, so results from different data sizes or code versions
+can be compared with `compare()`.
+
+Log-in and create_order write rows (an order per create_order iteration),
+so `flask bench run` only runs against a scratch database.
+"""
+import platform
+import re
+import statistics
+import subprocess
+import time
+from datetime import date
+from flask import url_for
+from app import db, counters
+from app.cache import cache
+from app.instrumentation import percentile
+from app.models import User, Customer, SubscriptionPlan, Counter
+
+SERVER_TIMING_QUERIES = re.compile(r'db;dur=[\d.]+;desc="(\d+) queries"')
+
+
+def _git_revision(root):
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=root,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _busiest_seller():
+    # The seller with the most customers has the slowest seller pages
+    key = db.session.query(Counter.key).filter(
+        Counter.key.like(counters.seller_key('%', counters.CUSTOMERS))
+    ).order_by(Counter.value.desc()).limit(1).scalar()
+    if key is None:
+        return User.query.filter_by(role='seller').order_by(User.id).first()
+    return db.session.get(User, int(key.split(':')[1]))
+
+
+def scenarios(app, admin, seller, admin_password):
+    """(label, client role, method, url, form data factory) for every benchmarked route"""
+    customer_id = db.session.query(Customer.id).filter_by(seller_id=seller.id).order_by(
+        Customer.id).limit(1).scalar()
+    plan_id = db.session.query(SubscriptionPlan.id).order_by(SubscriptionPlan.id).limit(1).scalar()
+    customer_name = db.session.query(Customer.name).filter_by(id=customer_id).scalar() or ''
+    search_term = customer_name.split()[-1] if customer_name else 'customer'
+
+    with app.test_request_context():
+        return [
+            ('auth.login', None, 'POST', url_for('auth.login'),
+             lambda: {'email': admin.email, 'password': admin_password}),
+            ('admin.dashboard', 'admin', 'GET', url_for('admin.dashboard'), None),
+            ('admin.orders', 'admin', 'GET', url_for('admin.orders'), None),
+            ('admin.orders filtered', 'admin', 'GET',
+             url_for('admin.orders', status='Active', seller=seller.id), None),
+            ('admin.customers', 'admin', 'GET', url_for('admin.customers'), None),
+            ('admin.customers search', 'admin', 'GET', url_for('admin.customers', search=search_term), None),
+            ('seller.dashboard', 'seller', 'GET', url_for('seller.dashboard'), None),
+            ('seller.orders', 'seller', 'GET', url_for('seller.orders'), None),
+            ('seller.customers', 'seller', 'GET', url_for('seller.customers'), None),
+            ('seller.create_order GET', 'seller', 'GET', url_for('seller.create_order'), None),
+            ('seller.create_order POST', 'seller', 'POST', url_for('seller.create_order'),
+             lambda: {'customer_id': customer_id, 'plan_id': plan_id,
+                      'start_date': date.today().isoformat(), 'payment_status': 'Paid'}),
+        ]
+
+
+def _open(app, client, url, method='GET', data=None):
+    # A fresh app context per request, as in a real server: otherwise the
+    # request reuses the caller's, with its `g` (and logged-in user) and session
+    with app.app_context():
+        return client.open(url, method=method, data=data)
+
+
+def _login(app, email, password):
+    client = app.test_client()
+    response = _open(app, client, '/login', 'POST', {'email': email, 'password': password})
+    if response.status_code != 302:
+        raise RuntimeError(f'Could not log in as {email}')
+    return client
+
+
+def run(app, iterations=20, only=None, admin_password='admin123', seller_password='seller123'):
+    """Benchmark every scenario (or those whose label contains `only`)"""
+    app.config['WTF_CSRF_ENABLED'] = False
+    app.config['PERF_LOG'] = False
+    with app.app_context():
+        # Setup in its own context so none of it leaks into the timed requests
+        seller = _busiest_seller()
+        if seller is None:
+            raise RuntimeError('No sellers to benchmark; run `flask data generate` first')
+        admin = db.session.query(User).filter_by(role='admin').order_by(User.id).first()
+        admin_email, seller_id, seller_email = admin.email, seller.id, seller.email
+        plan = scenarios(app, admin, seller, admin_password)
+    clients = {
+        'admin': _login(app, admin_email, admin_password),
+        'seller': _login(app, seller_email, seller_password),
+    }
+
+    runs = []
+    for label, role, method, url, data in plan:
+        runs.append((label, role, method, url, data, method == 'GET'))
+        if method == 'GET':
+            runs.append((f'{label} (warm)', role, method, url, data, False))
+
+    results = {}
+    for label, role, method, url, data, cold in runs:
+        if only and only not in label:
+            continue
+        timings, queries = [], []
+        for i in range(iterations + 1):
+            # Anonymous scenarios (log-in) need a fresh client, without a session, each time
+            client = clients[role] if role else app.test_client()
+            if cold:
+                cache.clear()
+            start = time.perf_counter()
+            response = _open(app, client, url, method, data() if data else None)
+            elapsed = (time.perf_counter() - start) * 1000
+            if response.status_code >= 400:
+                raise RuntimeError(f'{label}: HTTP {response.status_code}')
+            if response.status_code == 302 and method == 'GET':
+                raise RuntimeError(f'{label}: redirected to {response.location}')
+            if i == 0:
+                continue  # warm-up
+            timings.append(elapsed)
+            match = SERVER_TIMING_QUERIES.search(response.headers.get('Server-Timing', ''))
+            queries.append(int(match.group(1)) if match else None)
+        timings.sort()
+        results[label] = {
+            'method': method,
+            'url': url,
+            'iterations': iterations,
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+            'mean_ms': round(statistics.fmean(timings), 2),
+            'queries': max(queries) if None not in queries else None,
+        }
+
+    with app.app_context():
+        seller_customers = counters.seller_key(seller_id, counters.CUSTOMERS)
+        sizes = counters.get_counts([counters.SELLERS, counters.CUSTOMERS, counters.ORDERS, seller_customers])
+        database = db.engine.dialect.name
+    return {
+        'revision': _git_revision(app.root_path),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'database': database,
+        'data': {'sellers': sizes[counters.SELLERS], 'customers': sizes[counters.CUSTOMERS],
+                 'orders': sizes[counters.ORDERS],
+                 'benchmark_seller_customers': sizes[seller_customers]},
+        'routes': results,
+    }
+
+
+def compare(baseline, current):
+    """Yield (label, baseline p95, current p95, change %, baseline queries, current queries)"""
+    for label, result in current['routes'].items():
+        before = baseline['routes'].get(label)
+        if before is None:
+            continue
+        change = (result['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0
+        yield label, before['p95_ms'], result['p95_ms'], change, before['queries'], result['queries']
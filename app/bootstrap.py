@@ -0,0 +1,54 @@
+"""Database setup, run once per deployment rather than in every process.
+
+`create_app()` does no database I/O. `flask bootstrap` (or init_db.py)
+brings the schema up to the latest migration and creates the admin user if
+there is none. It is safe to run again and again.
+"""
+import os
+from sqlalchemy import inspect
+from sqlalchemy.exc import IntegrityError
+from app import db
+
+
+def init_migrate(app):
+    """Attach Flask-Migrate to `app`. Deferred because it imports Alembic"""
+    if 'migrate' not in app.extensions:
+        from flask_migrate import Migrate
+        directory = os.path.join(os.path.dirname(app.root_path), 'migrations')
+        Migrate(app, db, directory=directory)
+    return app.extensions['migrate']
+
+
+def upgrade_schema(app):
+    from flask_migrate import stamp, upgrade
+
+    init_migrate(app)
+    tables = inspect(db.engine).get_table_names()
+    if 'users' in tables and 'alembic_version' not in tables:
+        # Created by db.create_all() before migrations existed; the later
+        # revisions cope with objects that are already there
+        stamp(revision='0001')
+    upgrade()
+
+
+def seed_admin(email='admin@example.com', password=None):
+    """Create the admin user if there is none. Returns it if it was created"""
+    from app.models import User
+
+    if db.session.query(User.id).filter_by(role='admin').first():
+        return None
+    admin = User(username='admin', email=email, role='admin')
+    admin.set_password(password or os.getenv('DEFAULT_ADMIN_PASSWORD', 'admin123'))
+    db.session.add(admin)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another bootstrap got there first
+        db.session.rollback()
+        return None
+    return admin
+
+
+def bootstrap(app, admin_email='admin@example.com', admin_password=None):
+    upgrade_schema(app)
+    return seed_admin(admin_email, admin_password)
@@ -0,0 +1,266 @@
+"""Query-result and fragment cache for the dashboards and listings.
+
+Values are cached per namespace: `admin` for the admin pages and
+`seller:<id>` for each seller's pages. Every key embeds its namespace's
+generation number, so invalidating a namespace is a single increment and the
+old entries simply age out. Writes drive invalidation: the session listeners
+below collect the sellers touched by a flush and bump their namespaces (and
+`admin`) once the transaction commits. Code that writes through Core must
+call `changed()` before committing, or `invalidate()` after.
+
+The default backend is an in-process LRU; each process then invalidates only
+its own copy, and other processes catch up within CACHE_TTL seconds. Setting
+CACHE_URL to a redis:// URL shares the cache (and invalidation) between
+processes; that needs the `redis` package.
+"""
+import logging
+import pickle
+import threading
+import time
+from collections import Counter as Tally, OrderedDict
+from sqlalchemy import event, inspect
+from app import db
+from app.counters import seller_ids_for_customers
+from app.catalog import plans_written
+from app.models import User, Customer, Order
+from app.replica import primary_only
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 60
+DEFAULT_SIZE = 1024
+
+ADMIN = 'admin'
+# Bumped for changes every page shows, such as plan names
+EVERYTHING = 'all'
+
+
+def seller_namespace(seller_id):
+    return f'seller:{seller_id}'
+
+
+class LocalBackend:
+    """TTL + LRU dictionary for a single process"""
+
+    def __init__(self, maxsize=DEFAULT_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()  # key -> (expires, value)
+        # Generations are never evicted, or old entries could come back
+        self._generations = Tally()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, entry[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def generations(self, namespaces):
+        with self._lock:
+            return [self._generations[namespace] for namespace in namespaces]
+
+    def bump(self, namespaces):
+        with self._lock:
+            for namespace in namespaces:
+                self._generations[namespace] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            for namespace in self._generations:
+                self._generations[namespace] += 1
+
+    def describe(self):
+        return f'in-process LRU ({len(self._entries)}/{self.maxsize} entries)'
+
+
+class RedisBackend:
+    """Shared cache on a Redis-compatible server; errors count as misses"""
+
+    def __init__(self, url, prefix='scom:'):
+        import redis
+        self.url = url
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+        self._errors = (redis.RedisError,)
+
+    def _warn(self, action):
+        logger.warning('Cache %s failed on %s', action, self.url, exc_info=True)
+
+    def get(self, key):
+        try:
+            raw = self._client.get(self.prefix + key)
+        except self._errors:
+            self._warn('read')
+            return False, None
+        if raw is None:
+            return False, None
+        return True, pickle.loads(raw)
+
+    def set(self, key, value, ttl):
+        try:
+            self._client.set(self.prefix + key, pickle.dumps(value), ex=ttl)
+        except self._errors:
+            self._warn('write')
+
+    def generations(self, namespaces):
+        try:
+            values = self._client.mget([f'{self.prefix}gen:{namespace}' for namespace in namespaces])
+        except self._errors:
+            self._warn('read')
+            return None
+        return [int(value or 0) for value in values]
+
+    def bump(self, namespaces):
+        try:
+            pipe = self._client.pipeline()
+            for namespace in namespaces:
+                pipe.incr(f'{self.prefix}gen:{namespace}')
+            pipe.execute()
+        except self._errors:
+            self._warn('invalidation')
+
+    def clear(self):
+        self.bump([EVERYTHING])
+
+    def describe(self):
+        return f'redis ({self.url})'
+
+
+class Cache:
+    def __init__(self, backend=None, ttl=DEFAULT_TTL):
+        self.backend = backend or LocalBackend()
+        self.ttl = ttl
+        self._hits = Tally()
+        self._misses = Tally()
+        self._lock = threading.Lock()
+
+    def get_or_set(self, namespace, name, factory, params=None, ttl=None, primary=True):
+        """Return the cached value of `name`, calling `factory` on a miss.
+
+        `params` (a dict) tells apart values of the same name, such as one
+        listing under different filters; metrics are still kept per name.
+        The factory reads the primary database, since the value is stored
+        under the current generation; pass `primary=False` only when
+        `params` carry a data version read from the same database as the
+        factory's queries.
+        """
+        generations = self.backend.generations([EVERYTHING, namespace])
+        if generations is None:
+            # Backend unavailable: serve uncached rather than fail the page
+            self._count(self._misses, name)
+            return factory()
+        key = f'{namespace}@{generations[1]}.{generations[0]}:{name}'
+        if params:
+            key += ':' + repr(sorted(params.items()))
+
+        found, value = self.backend.get(key)
+        if found:
+            self._count(self._hits, name)
+            return value
+        self._count(self._misses, name)
+        if primary:
+            with primary_only():
+                value = factory()
+        else:
+            value = factory()
+        self.backend.set(key, value, ttl or self.ttl)
+        return value
+
+    def _count(self, tally, name):
+        with self._lock:
+            tally[name] += 1
+
+    def invalidate(self, *namespaces):
+        if namespaces:
+            self.backend.bump(namespaces)
+
+    def clear(self):
+        self.backend.clear()
+
+    def metrics(self):
+        """Hit/miss counts per cached name in this process, busiest first"""
+        with self._lock:
+            names = set(self._hits) | set(self._misses)
+            rows = [{'name': name, 'hits': self._hits[name], 'misses': self._misses[name]}
+                    for name in names]
+        for row in rows:
+            row['hit_rate'] = row['hits'] / (row['hits'] + row['misses'])
+        return sorted(rows, key=lambda row: -(row['hits'] + row['misses']))
+
+    def reset_metrics(self):
+        with self._lock:
+            self._hits.clear()
+            self._misses.clear()
+
+
+cache = Cache()
+
+
+def changed(session, seller_ids=(), everything=False):
+    """Invalidate the given sellers' pages (or all pages) when `session` commits"""
+    pending = session.info.setdefault('cache_changed', set())
+    if everything:
+        pending.add(EVERYTHING)
+    elif seller_ids:
+        pending.add(ADMIN)
+        pending.update(seller_namespace(seller_id) for seller_id in seller_ids)
+
+
+def _after_flush(session, flush_context):
+    if plans_written(session):
+        changed(session, everything=True)
+        return
+
+    sellers, customer_ids = set(), set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User):
+            sellers.add(obj.id)
+        elif isinstance(obj, Customer):
+            sellers.add(obj.seller_id)
+            # A customer moved to another seller changes the old seller's pages too
+            sellers.update(inspect(obj).attrs.seller_id.history.deleted)
+        elif isinstance(obj, Order):
+            customer_ids.add(obj.customer_id)
+
+    known = {obj.id: obj.seller_id for obj in session.deleted if isinstance(obj, Customer)}
+    missing = customer_ids - known.keys()
+    if missing:
+        known.update(seller_ids_for_customers(session.connection(), missing))
+    sellers.update(known[customer_id] for customer_id in customer_ids if customer_id in known)
+    sellers.discard(None)
+    if sellers:
+        changed(session, sellers)
+
+
+def _after_commit(session):
+    pending = session.info.pop('cache_changed', None)
+    if pending:
+        cache.invalidate(*pending)
+
+
+def _after_rollback(session):
+    session.info.pop('cache_changed', None)
+
+
+def init_app(app):
+    url = app.config.get('CACHE_URL')
+    maxsize = app.config.get('CACHE_SIZE', DEFAULT_SIZE)
+    cache.backend = RedisBackend(url) if url else LocalBackend(maxsize)
+    cache.ttl = app.config.get('CACHE_TTL', DEFAULT_TTL)
+    for name, listener in (('after_flush', _after_flush), ('after_commit', _after_commit),
+                           ('after_rollback', _after_rollback)):
+        if not event.contains(db.session, name, listener):
+            event.listen(db.session, name, listener)
@@ -0,0 +1,129 @@
+"""Process-local catalog of subscription plans.
+
+Plans change almost never, but their names, prices and durations show on
+every order page. The catalog loads them all once per process and serves
+them from a dict keyed by id, so listings no longer join
+`subscription_plans` and order creation no longer queries it.
+
+Plan writes bump a version number in the `counters` table (key
+`plans:version`) in the same transaction. The writing process reloads as
+soon as it commits; the others compare versions at most every
+PLAN_CATALOG_CHECK seconds and reload when theirs is behind.
+"""
+import threading
+import time
+from sqlalchemy import event
+from app import db, counters
+from app.models import SubscriptionPlan
+
+VERSION_KEY = 'plans:version'
+DEFAULT_CHECK_INTERVAL = 30
+
+
+class Plan:
+    """Read-only copy of a SubscriptionPlan row"""
+    __slots__ = ('id', 'name', 'description', 'price', 'duration_days')
+
+    def __init__(self, id, name, description, price, duration_days):
+        self.id = id
+        self.name = name
+        self.description = description
+        self.price = price
+        self.duration_days = duration_days
+
+    def __repr__(self):
+        return f'<Plan {self.name}>'
+
+
+class PlanCatalog:
+    def __init__(self, check_interval=DEFAULT_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self.version = None
+        self._plans = None  # id -> Plan, in id order
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def _stored_version(self):
+        return counters.get_counts([VERSION_KEY])[VERSION_KEY]
+
+    def _current(self):
+        plans = self._plans
+        if plans is not None and time.monotonic() - self._checked < self.check_interval:
+            return plans
+        with self._lock:
+            if self._plans is not None and time.monotonic() - self._checked < self.check_interval:
+                return self._plans
+            version = self._stored_version()
+            if self._plans is None or version != self.version:
+                rows = db.session.query(
+                    SubscriptionPlan.id, SubscriptionPlan.name, SubscriptionPlan.description,
+                    SubscriptionPlan.price, SubscriptionPlan.duration_days
+                ).order_by(SubscriptionPlan.id)
+                self._plans = {row.id: Plan(*row) for row in rows}
+                self.version = version
+            self._checked = time.monotonic()
+            return self._plans
+
+    def get(self, plan_id):
+        """The Plan with this id, or None"""
+        return self._current().get(plan_id)
+
+    def all(self):
+        return list(self._current().values())
+
+    def current_version(self):
+        self._current()
+        return self.version
+
+    def invalidate(self):
+        with self._lock:
+            self._plans = None
+
+
+catalog = PlanCatalog()
+
+
+def get_plan(plan_id):
+    return catalog.get(plan_id)
+
+
+def all_plans():
+    return catalog.all()
+
+
+def changed(session):
+    """Bump the plan version for Core writes to subscription_plans; reloads on commit"""
+    counters.apply_deltas(session.connection(), {VERSION_KEY: 1})
+    session.info['plans_changed'] = True
+
+
+def plans_written(session):
+    """Whether the session's pending flush adds, changes or deletes a plan"""
+    if any(isinstance(obj, SubscriptionPlan) for obj in list(session.new) + list(session.deleted)):
+        return True
+    # A new order's backref can mark its plan dirty without changing a column
+    return any(isinstance(obj, SubscriptionPlan) and session.is_modified(obj, include_collections=False)
+               for obj in session.dirty)
+
+
+def _after_flush(session, flush_context):
+    if plans_written(session):
+        changed(session)
+
+
+def _after_commit(session):
+    if session.info.pop('plans_changed', False):
+        catalog.invalidate()
+
+
+def _after_rollback(session):
+    session.info.pop('plans_changed', None)
+
+
+def init_app(app):
+    catalog.check_interval = app.config.get('PLAN_CATALOG_CHECK', DEFAULT_CHECK_INTERVAL)
+    app.add_template_global(get_plan, 'plan')
+    for name, listener in (('after_flush', _after_flush), ('after_commit', _after_commit),
+                           ('after_rollback', _after_rollback)):
+        if not event.contains(db.session, name, listener):
+            event.listen(db.session, name, listener)
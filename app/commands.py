@@ -0,0 +1,536 @@
+import os
+import subprocess
+import sys
+import click
+from flask import current_app
+from flask.cli import AppGroup, ScriptInfo, with_appcontext
+
+# Counter maintenance commands
+counters_cli = AppGroup('counters', help='Maintain the materialized dashboard counters.')
+
+
+@counters_cli.command('rebuild')
+def rebuild_counters():
+    """Recompute all dashboard counters from the base tables."""
+    from app import counters
+    from app.cache import cache
+    
+    values = counters.rebuild()
+    cache.clear()
+    click.echo(f'Rebuilt {len(values)} counters '
+               f'({values[counters.SELLERS]} sellers, {values[counters.CUSTOMERS]} customers, '
+               f'{values[counters.ORDERS]} orders).')
+
+
+# Analytics rollup commands
+rollups_cli = AppGroup('rollups', help='Maintain the daily revenue and subscription rollups.')
+
+
+@rollups_cli.command('rebuild')
+def rebuild_rollups():
+    """Recompute the daily rollups behind the dashboard analytics from the orders."""
+    from app import rollups
+    from app.cache import cache
+    
+    rows = rollups.rebuild()
+    cache.clear()
+    click.echo(f'Rebuilt {rows} daily rollup rows.')
+
+
+# Reporting commands
+reports_cli = AppGroup('reports', help='Ad-hoc order analytics (needs numpy).')
+
+
+@reports_cli.command('orders')
+@click.option('--seller', help='Username of the seller whose orders to report on.')
+@click.option('--plan', 'plan_id', type=int, help='Only orders for this plan id.')
+@click.option('--months', default=12, show_default=True, help='Months of history to show.')
+@click.option('--json', 'as_json', is_flag=True, help='Print the report as JSON.')
+def report_orders(seller, plan_id, months, as_json):
+    """Active subscriptions by plan, renewal intervals and cohort retention."""
+    import json
+    from app.catalog import get_plan
+    from app.models import User
+    from app.replica import replica_reads
+    from app.reports import cached_report
+    
+    seller_id = None
+    if seller:
+        user = User.query.filter_by(username=seller, role='seller').first()
+        if not user:
+            raise click.BadParameter(f'No seller named {seller!r}', param_hint='--seller')
+        seller_id = user.id
+    
+    with replica_reads():
+        report = cached_report(seller_id=seller_id, plan_id=plan_id, months=months)
+    if as_json:
+        click.echo(json.dumps(report, indent=2, default=str))
+        return
+    
+    click.echo(f'{report["orders"]} orders, {report["subscriptions"]} subscriptions\n')
+    names = [get_plan(row['plan_id']).name if get_plan(row['plan_id']) else f'#{row["plan_id"]}'
+             for row in report['active_by_plan']]
+    click.echo('Active at start of month')
+    click.echo(f'{"month":<10}' + ''.join(f'{name[:10]:>11}' for name in names) + f'{"total":>11}')
+    for index, month in enumerate(report['months']):
+        counts = [row['counts'][index] for row in report['active_by_plan']]
+        click.echo(f'{month:%Y-%m}    ' + ''.join(f'{count:>11}' for count in counts)
+                   + f'{report["active_total"][index]:>11}')
+    
+    renewals = report['renewals']
+    rate = f'{renewals["renewal_rate"]:.1%}' if renewals['renewal_rate'] is not None else '-'
+    median = f'{renewals["median_gap"]:.0f} days' if renewals['median_gap'] is not None else '-'
+    click.echo(f'\nRenewals: {renewals["renewals"]}, rate {rate}, median gap {median}')
+    for bucket in renewals['buckets']:
+        click.echo(f'  {bucket["label"]:>12} days {bucket["count"]:>10}')
+    
+    click.echo('\nRetention by first subscription month')
+    click.echo(f'{"cohort":<10}{"customers":>10}' + ''.join(f'{f"M{k}":>6}' for k in range(months)))
+    for cohort in report['cohorts']:
+        shares = ''.join(f'{share:>6.0%}' if share is not None else f'{"":>6}' for share in cohort['retention'])
+        click.echo(f'{cohort["month"]:%Y-%m}    {cohort["customers"]:>10}{shares}')
+
+
+# Cache commands
+cache_cli = AppGroup('cache', help='Dashboard and listing cache.')
+
+
+@cache_cli.command('clear')
+def clear_cache():
+    """Drop every cached page fragment and query result."""
+    from app.cache import cache, LocalBackend
+    
+    if isinstance(cache.backend, LocalBackend):
+        click.echo('CACHE_URL is not set: each server process keeps its own cache, '
+                   'which empties on restart or after CACHE_TTL seconds.')
+        return
+    cache.clear()
+    click.echo(f'Cleared {cache.backend.describe()}.')
+
+
+# API commands
+api_cli = AppGroup('api', help='JSON API administration.')
+
+
+@api_cli.command('token')
+@click.argument('email')
+def api_token(email):
+    """Print a bearer token for the user with EMAIL."""
+    from app.api.auth import issue_token
+    from app.models import User
+    
+    user = User.query.filter_by(email=email).first()
+    if user is None:
+        raise click.ClickException(f'No user with email {email}')
+    click.echo(issue_token(user.id))
+
+
+# Order maintenance commands
+orders_cli = AppGroup('orders', help='Order maintenance tasks.')
+
+
+@orders_cli.command('expire')
+@click.option('--chunk-size', default=1000, show_default=True,
+              help='Rows updated per transaction.')
+def expire_orders(chunk_size):
+    """Mark Active orders past their end date as Expired."""
+    from app.expiry import expire_orders
+    
+    expired = expire_orders(chunk_size=chunk_size)
+    click.echo(f'Expired {expired} orders.')
+
+
+@orders_cli.command('renew')
+@click.option('--from', 'window_start', type=click.DateTime(formats=['%Y-%m-%d']),
+              help='First end date to renew (default: today).')
+@click.option('--to', 'window_end', type=click.DateTime(formats=['%Y-%m-%d']),
+              help='Renew orders ending before this date (default: --days after --from).')
+@click.option('--days', default=7, show_default=True, help='Window length when --to is not given.')
+@click.option('--seller', help='Only renew the customers of the seller with this username.')
+@click.option('--chunk-size', default=1000, show_default=True, help='Orders renewed per transaction.')
+@click.option('--dry-run', is_flag=True, help='Report what would be renewed without writing anything.')
+def renew_orders(window_start, window_end, days, seller, chunk_size, dry_run):
+    """Create successor orders for Active/Expired orders ending in a date window. Safe to re-run."""
+    from datetime import datetime, timedelta
+    from app.catalog import get_plan
+    from app.models import User
+    from app.renewals import renew_orders
+    
+    window_start = window_start or datetime.combine(datetime.utcnow().date(), datetime.min.time())
+    window_end = window_end or window_start + timedelta(days=days)
+    seller_id = None
+    if seller:
+        user = User.query.filter_by(username=seller, role='seller').first()
+        if not user:
+            raise click.BadParameter(f'No seller named {seller!r}', param_hint='--seller')
+        seller_id = user.id
+    
+    def progress(report):
+        done = report.candidates if report.dry_run else report.renewed
+        click.echo(f'\r{done} orders, {report.rate:.0f}/s', nl=False)
+    
+    report = renew_orders(window_start, window_end, seller_id=seller_id, chunk_size=chunk_size,
+                          dry_run=dry_run, progress=progress)
+    verb = 'Would renew' if dry_run else 'Renewed'
+    click.echo(f'\r{verb} {sum(report.by_plan.values())} orders ending {window_start:%Y-%m-%d} to '
+               f'{window_end:%Y-%m-%d} in {report.elapsed:.1f}s ({report.rate:.0f} orders/s), '
+               f'skipped {report.skipped}.')
+    for plan_id, count in report.by_plan.most_common():
+        plan = get_plan(plan_id)
+        click.echo(f'  {plan.name if plan else plan_id}: {count}')
+    click.echo(f'Order value: ${report.revenue:,.2f}')
+
+
+# Background job commands
+jobs_cli = AppGroup('jobs', help='Background job queue.')
+
+
+@jobs_cli.command('work')
+@click.option('--processes', '-p', default=2, show_default=True,
+              help='Worker processes; 1 runs jobs in this process.')
+@click.option('--once', is_flag=True, help='Exit once no job is due instead of waiting for more.')
+def work_jobs(processes, once):
+    """Run queued jobs until interrupted. Ctrl-C lets running jobs finish first."""
+    import logging
+    import threading
+    from app import jobs
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(processName)s %(message)s')
+    click.echo(f'Running jobs with {processes} worker process{"es" if processes != 1 else ""}.')
+    if processes > 1:
+        jobs.run_pool(processes, once=once)
+        return
+    stop = threading.Event()
+    try:
+        ran = jobs.work(stop, once=once)
+    except KeyboardInterrupt:
+        # Only reached between jobs or with a job cut short; a stale job is recovered later
+        click.echo('Interrupted.', err=True)
+        raise SystemExit(1)
+    click.echo(f'Ran {ran} jobs.')
+
+
+@jobs_cli.command('list')
+@click.option('--status', type=click.Choice(['queued', 'running', 'succeeded', 'failed', 'cancelled']))
+@click.option('--limit', default=20, show_default=True)
+def list_jobs(status, limit):
+    """Show the most recent jobs."""
+    from app.models import Job
+    
+    query = Job.query.order_by(Job.id.desc())
+    if status:
+        query = query.filter_by(status=status)
+    for job in query.limit(limit):
+        progress = f'{job.progress}/{job.total}' if job.total else str(job.progress)
+        click.echo(f'{job.id:>6}  {job.kind:<18}{job.status:<11}{progress:>14}  '
+                   f'attempt {job.attempts}/{job.max_attempts}  {job.created_at:%Y-%m-%d %H:%M:%S}')
+
+
+@jobs_cli.command('cancel')
+@click.argument('job_id', type=int)
+def cancel_job(job_id):
+    """Cancel a queued job, or ask a running one to stop."""
+    from app.jobs import cancel
+    
+    if not cancel(job_id):
+        raise click.ClickException(f'Job {job_id} does not exist or has already finished')
+    click.echo(f'Cancellation of job {job_id} requested.')
+
+
+@jobs_cli.command('stats')
+def job_stats():
+    """Job counts by status and run/wait time percentiles per kind."""
+    from app.jobs import metrics
+    
+    def seconds(value):
+        return f'{value:.1f}' if value is not None else '-'
+    
+    click.echo(f'{"kind":<18}{"queued":>7}{"running":>8}{"ok":>7}{"failed":>7}{"cancel":>7}{"retried":>8}'
+               f'{"run p50 s":>10}{"run p95 s":>10}{"wait p95 s":>11}')
+    for row in metrics():
+        click.echo(f'{row["kind"]:<18}{row["queued"]:>7}{row["running"]:>8}{row["succeeded"]:>7}'
+                   f'{row["failed"]:>7}{row["cancelled"]:>7}{row["retried"]:>8}{seconds(row["run_p50"]):>10}'
+                   f'{seconds(row["run_p95"]):>10}{seconds(row["wait_p95"]):>11}')
+
+
+@jobs_cli.command('prune')
+@click.option('--days', default=30, show_default=True, help='Keep jobs that finished more recently.')
+def prune_jobs(days):
+    """Delete finished jobs, and their uploads and downloads, older than --days."""
+    from app.jobs import prune
+    
+    click.echo(f'Deleted {prune(days)} jobs.')
+
+
+# Customer data commands
+customers_cli = AppGroup('customers', help='Bulk customer data tasks.')
+
+
+@customers_cli.command('import')
+@click.argument('csv_file', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--seller', help='Username of the seller for rows without a Seller column.')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows inserted per transaction.')
+def import_customers(csv_file, seller, batch_size):
+    """Import customers from a CSV file with Name, Email, Phone, Address, Seller columns."""
+    from app.importer import import_customers
+    from app.models import User
+    
+    default_seller_id = None
+    if seller:
+        user = User.query.filter_by(username=seller, role='seller').first()
+        if not user:
+            raise click.BadParameter(f'No seller named {seller!r}', param_hint='--seller')
+        default_seller_id = user.id
+    
+    report = import_customers(csv_file, default_seller_id=default_seller_id, batch_size=batch_size)
+    for line, message in report.errors:
+        click.echo(f'line {line}: {message}', err=True)
+    if report.rejected > len(report.errors):
+        click.echo(f'({report.rejected - len(report.errors)} more errors not shown)', err=True)
+    click.echo(f'Imported {report.inserted} customers, rejected {report.rejected} rows.')
+
+
+@customers_cli.command('reindex')
+def reindex_customers():
+    """Create (if missing) and rebuild the customer full-text search index."""
+    from app.search import rebuild
+    
+    rebuild()
+    click.echo('Customer search index rebuilt.')
+
+
+@click.command('explain')
+@click.option('--strict', is_flag=True, help='Exit non-zero if any query does a full table scan.')
+def explain_queries(strict):
+    """Print the query plan of every route query and flag full table scans."""
+    from app.explain import route_queries, explain
+    
+    flagged = []
+    for label, query in route_queries():
+        lines, full_scans = explain(query)
+        click.echo(f'== {label}')
+        for line in lines:
+            marker = '  !! ' if line in full_scans else '     '
+            click.echo(f'{marker}{line}')
+        if full_scans:
+            flagged.append(label)
+    
+    if flagged:
+        click.echo(f'\nFull table scans in: {", ".join(flagged)}')
+        if strict:
+            raise SystemExit(1)
+    else:
+        click.echo('\nNo full table scans.')
+
+
+class MigrateGroup(click.Group):
+    """`flask db`, importing Flask-Migrate (and Alembic) only when it is used"""
+    
+    def _target(self, ctx):
+        from app.bootstrap import init_migrate
+        from flask_migrate.cli import db as db_cli
+        
+        init_migrate(ctx.ensure_object(ScriptInfo).load_app())
+        return db_cli
+    
+    def list_commands(self, ctx):
+        return self._target(ctx).list_commands(ctx)
+    
+    def get_command(self, ctx, name):
+        return self._target(ctx).get_command(ctx, name)
+
+
+db_cli = MigrateGroup('db', help='Perform database migrations.')
+
+
+@click.command('bootstrap')
+@click.option('--admin-email', default='admin@example.com', show_default=True,
+              help='Email for the admin user if one has to be created.')
+@with_appcontext
+def bootstrap_database(admin_email):
+    """Upgrade the schema to the latest migration and create the admin user. Safe to re-run."""
+    from app.bootstrap import bootstrap
+    
+    admin = bootstrap(current_app, admin_email=admin_email)
+    if admin:
+        click.echo(f'Created admin user {admin.email} (password from DEFAULT_ADMIN_PASSWORD).')
+    click.echo('Database is up to date.')
+
+
+# Cold start: time `from app import create_app; create_app()` in a fresh interpreter
+STARTUP_SCRIPT = ('import time; start = time.perf_counter(); from app import create_app; create_app(); '
+                  'print((time.perf_counter() - start) * 1000)')
+
+
+def _parse_importtime(stderr):
+    """Yield (self_us, cumulative_us, depth, module) from `python -X importtime` output"""
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        yield int(self_us), int(cumulative_us), (len(name) - len(name.lstrip()) - 1) // 2, name.strip()
+
+
+@click.command('startup-time')
+@click.option('--budget-ms', default=1000, show_default=True, type=int,
+              help='Fail if create_app() takes longer than this from a cold interpreter.')
+@click.option('--top', default=15, show_default=True, help='Number of slowest imports to list.')
+def startup_time(budget_ms, top):
+    """Measure cold-start time with `python -X importtime` and check it against a budget."""
+    root = os.path.dirname(current_app.root_path)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [root, os.getenv('PYTHONPATH')])))
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', STARTUP_SCRIPT],
+                            capture_output=True, text=True, cwd=root, env=env)
+    if result.returncode != 0:
+        click.echo(result.stderr, err=True)
+        raise SystemExit(result.returncode)
+    
+    imports = list(_parse_importtime(result.stderr))
+    total_ms = float(result.stdout.strip().splitlines()[-1])
+    import_ms = sum(self_us for self_us, _, _, _ in imports) / 1000
+    
+    click.echo(f'{"cumulative ms":>14}  module')
+    # The app package and what it imports directly; deeper entries are in their totals
+    slowest = sorted((entry for entry in imports if entry[2] <= 1), key=lambda entry: -entry[1])
+    for _, cumulative_us, depth, name in slowest[:top]:
+        click.echo(f'{cumulative_us / 1000:14.1f}  {"  " * depth}{name}')
+    click.echo(f'\nImports: {import_ms:.0f} ms of {total_ms:.0f} ms for create_app() (budget {budget_ms} ms)')
+    if total_ms > budget_ms:
+        click.echo('Over budget.', err=True)
+        raise SystemExit(1)
+
+
+def _scratch_app(database_url):
+    # An app on the --database-url database, which must not be the configured one
+    from app import db
+    from app.engine import scratch_app
+    
+    configured = db.engine.url
+    app = scratch_app(database_url)
+    with app.app_context():
+        if db.engine.url == configured:
+            raise click.BadParameter('That is the configured database; give a scratch copy.',
+                                     param_hint='--database-url')
+    return app
+
+
+@click.command('db-stress')
+@click.option('--database-url', required=True,
+              help='Scratch database to write to (a copy of the real one); never the configured DATABASE_URL.')
+@click.option('--writers', default=8, show_default=True, help='Concurrent writer processes.')
+@click.option('--writes', default=100, show_default=True, help='Transactions per writer.')
+@click.option('--keep', is_flag=True, help='Leave the rows written by the test in place.')
+@with_appcontext
+def db_stress(database_url, writers, writes, keep):
+    """Hammer a scratch database with concurrent create_order-style writes and report lock errors."""
+    from app.engine import stress, stress_target, cleanup_stress_rows
+    
+    with _scratch_app(database_url).app_context():
+        target = stress_target()
+        if target is None:
+            raise click.ClickException('The scratch database needs a seller and a subscription plan.')
+        
+        latencies, errors, elapsed = stress(database_url, target, writers, writes)
+        if latencies:
+            p50 = latencies[len(latencies) // 2] * 1000
+            p95 = latencies[int(len(latencies) * 0.95)] * 1000
+            click.echo(f'{len(latencies)} commits in {elapsed:.1f}s ({len(latencies) / elapsed:.0f}/s), '
+                       f'p50 {p50:.1f} ms, p95 {p95:.1f} ms')
+        for message in sorted(set(errors)):
+            click.echo(f'{errors.count(message)} x {message}', err=True)
+        if not keep:
+            cleanup_stress_rows()
+    if errors:
+        raise SystemExit(1)
+
+
+# Synthetic data and benchmarks
+data_cli = AppGroup('data', help='Synthetic data for benchmarks.')
+
+
+@data_cli.command('generate')
+@click.option('--sellers', default=10, show_default=True, help='Sellers to add.')
+@click.option('--customers', default=100, show_default=True, help='Average customers per seller.')
+@click.option('--orders', default=5.0, show_default=True, help='Average orders per customer.')
+@click.option('--skew', default=1.1, show_default=True,
+              help='Zipf exponent for customers per seller (0 spreads them evenly).')
+@click.option('--seed', type=int, help='Random seed, for repeatable data sets.')
+@click.option('--batch-size', default=5000, show_default=True, help='Rows inserted per transaction.')
+def generate_data(sellers, customers, orders, skew, seed, batch_size):
+    """Bulk-insert sellers, customers and orders (seller passwords are "seller123")."""
+    import time
+    from app.datagen import generate
+    
+    start = time.perf_counter()
+    
+    def progress(totals):
+        click.echo(f'\r{totals["customers"]} customers, {totals["orders"]} orders', nl=False)
+    
+    totals = generate(sellers, customers, orders, skew=skew, seed=seed, batch_size=batch_size,
+                      progress=progress)
+    click.echo(f'\rAdded {totals["sellers"]} sellers, {totals["customers"]} customers and '
+               f'{totals["orders"]} orders in {time.perf_counter() - start:.1f}s.')
+
+
+bench_cli = AppGroup('bench', help='Route benchmarks.')
+
+
+@bench_cli.command('run')
+@click.option('--database-url', required=True,
+              help='Generated scratch database to benchmark (log-in and create_order write to it).')
+@click.option('--iterations', default=20, show_default=True, help='Requests per route after a warm-up.')
+@click.option('--only', help='Only routes whose label contains this text.')
+@click.option('--admin-password', default=lambda: os.getenv('DEFAULT_ADMIN_PASSWORD', 'admin123'),
+              show_default='DEFAULT_ADMIN_PASSWORD or admin123')
+@click.option('--seller-password', default='seller123', show_default=True)
+@click.option('--output', '-o', type=click.File('w'), help='Write the JSON results here.')
+def run_benchmark(database_url, iterations, only, admin_password, seller_password, output):
+    """Time every route through the test client and report latency and query counts."""
+    import json
+    from app.benchmark import run
+    
+    results = run(_scratch_app(database_url), iterations=iterations, only=only,
+                  admin_password=admin_password, seller_password=seller_password)
+    data = results['data']
+    click.echo(f'{data["sellers"]} sellers, {data["customers"]} customers, {data["orders"]} orders '
+               f'({data["benchmark_seller_customers"]} customers for the benchmarked seller)')
+    click.echo(f'{"route":<32}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"queries":>9}')
+    for label, result in results['routes'].items():
+        click.echo(f'{label:<32}{result["p50_ms"]:>9.1f}{result["p95_ms"]:>9.1f}'
+                   f'{result["p99_ms"]:>9.1f}{result["queries"]!s:>9}')
+    if output:
+        json.dump(results, output, indent=2)
+        output.write('\n')
+
+
+@bench_cli.command('compare')
+@click.argument('baseline', type=click.File('r'))
+@click.argument('current', type=click.File('r'))
+def compare_benchmarks(baseline, current):
+    """Compare two `flask bench run --output` files by p95 latency and query count."""
+    import json
+    from app.benchmark import compare
+    
+    click.echo(f'{"route":<32}{"p95 before":>12}{"p95 after":>12}{"change":>9}{"queries":>12}')
+    for label, before, after, change, queries_before, queries_after in compare(
+            json.load(baseline), json.load(current)):
+        click.echo(f'{label:<32}{before:>12.1f}{after:>12.1f}{change:>+8.0f}%'
+                   f'{f"{queries_before} -> {queries_after}":>12}')
+
+
+def register_commands(app):
+    app.cli.add_command(db_cli)
+    app.cli.add_command(bootstrap_database)
+    app.cli.add_command(startup_time)
+    app.cli.add_command(counters_cli)
+    app.cli.add_command(rollups_cli)
+    app.cli.add_command(reports_cli)
+    app.cli.add_command(cache_cli)
+    app.cli.add_command(api_cli)
+    app.cli.add_command(orders_cli)
+    app.cli.add_command(jobs_cli)
+    app.cli.add_command(customers_cli)
+    app.cli.add_command(explain_queries)
+    app.cli.add_command(db_stress)
+    app.cli.add_command(data_cli)
+    app.cli.add_command(bench_cli)
@@ -0,0 +1,79 @@
+"""Conditional GET for the listing and export pages.
+
+A listing's ETag is built from a cheap version of the data it shows: the
+newest updated_at and a row count over its filter scope. When the browser
+revalidates with a matching If-None-Match, the view is never called, so
+neither its query nor its template runs. The ETag also covers the viewer,
+the deployed templates, the plan catalog version and the CSRF token window,
+so a 304 never brings back markup from another user or release, a renamed
+plan, or a form whose token has expired.
+Last-Modified is sent as well, but deletes do not move it, so only the ETag
+decides a 304.
+"""
+import hashlib
+import os
+import time
+from functools import wraps
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+from app.catalog import catalog
+
+
+def templates_release(app):
+    # Newest template mtime; a deploy that changes the markup changes every ETag
+    root = os.path.join(app.root_path, app.template_folder)
+    return max((os.path.getmtime(os.path.join(folder, name))
+                for folder, _, names in os.walk(root) for name in names), default=0)
+
+
+def _csrf_window():
+    # Re-render at least every half token lifetime, so served forms stay valid
+    config = current_app.config
+    limit = config.get('WTF_CSRF_TIME_LIMIT', 3600)
+    if not config.get('WTF_CSRF_ENABLED', True) or not limit:
+        return None
+    return int(time.time() // (limit / 2))
+
+
+def _etag(last_modified, token):
+    parts = (current_user.get_id(), current_app.extensions.get('templates_release'), _csrf_window(),
+             catalog.current_version(), last_modified and last_modified.isoformat(), token)
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:20]
+
+
+def conditional(version):
+    """Answer GETs of the wrapped view with 304 while `version()` is unchanged.
+
+    `version` returns (last_modified, token): the newest change in the page's
+    scope (or None) and anything else its content depends on, such as row
+    counts.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            # Pending flash messages have to be rendered, not answered with a 304
+            if request.method != 'GET' or '_flashes' in session:
+                return view(*args, **kwargs)
+
+            last_modified, token = version()
+            etag = _etag(last_modified, token)
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            if last_modified:
+                response.last_modified = last_modified
+            # Browsers may keep the page but must check back before reusing it
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
+        return wrapped
+    return decorator
+
+
+def init_app(app):
+    app.extensions['templates_release'] = templates_release(app)
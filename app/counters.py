@@ -0,0 +1,140 @@
+"""Materialized row counters for the dashboards.
+
+Counts live in the `counters` table and are kept current from the session's
+flush events, so the dashboards read a handful of rows by primary key instead
+of running COUNT(*) over users/customers/orders. Code that writes through
+Core (bulk inserts) bypasses those events and must call `apply_deltas`
+itself. `flask counters rebuild` recomputes everything from scratch.
+"""
+from collections import Counter as Tally
+from sqlalchemy import event, func, inspect, or_, select
+from app import db
+from app.models import User, Customer, Order, Counter
+
+SELLERS = 'sellers'
+CUSTOMERS = 'customers'
+ORDERS = 'orders'
+
+
+def seller_key(seller_id, name):
+    return f'seller:{seller_id}:{name}'
+
+
+def get_counts(keys):
+    """Return {key: value} for the given keys, 0 for keys never written"""
+    rows = db.session.query(Counter.key, Counter.value).filter(Counter.key.in_(keys))
+    counts = dict.fromkeys(keys, 0)
+    counts.update(rows)
+    return counts
+
+
+def apply_deltas(connection, deltas):
+    # Increment in place; create the row the first time a key is seen
+    table = Counter.__table__
+    for key, delta in deltas.items():
+        if not delta:
+            continue
+        result = connection.execute(
+            table.update().where(table.c.key == key).values(value=table.c.value + delta)
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(key=key, value=delta))
+
+
+def seller_ids_for_customers(connection, customer_ids):
+    if not customer_ids:
+        return {}
+    table = Customer.__table__
+    rows = connection.execute(
+        select(table.c.id, table.c.seller_id).where(table.c.id.in_(customer_ids))
+    )
+    return dict(rows.all())
+
+
+def _collect_deltas(session):
+    deltas = Tally()
+    new_orders, deleted_orders = [], []
+    # Sellers of customers deleted in this flush, whose rows are already gone
+    deleted_customer_sellers = {}
+
+    for obj, sign in [(o, 1) for o in session.new] + [(o, -1) for o in session.deleted]:
+        if isinstance(obj, User):
+            if obj.role == 'seller':
+                deltas[SELLERS] += sign
+        elif isinstance(obj, Customer):
+            deltas[CUSTOMERS] += sign
+            deltas[seller_key(obj.seller_id, CUSTOMERS)] += sign
+            if sign < 0:
+                deleted_customer_sellers[obj.id] = obj.seller_id
+        elif isinstance(obj, Order):
+            deltas[ORDERS] += sign
+            (new_orders if sign > 0 else deleted_orders).append(obj)
+
+    # Role changes and customers moved between sellers
+    for obj in session.dirty:
+        if isinstance(obj, User):
+            added, _, removed = inspect(obj).attrs.role.history
+            if added and removed and (added[0] == 'seller') != (removed[0] == 'seller'):
+                deltas[SELLERS] += 1 if added[0] == 'seller' else -1
+        elif isinstance(obj, Customer):
+            added, _, removed = inspect(obj).attrs.seller_id.history
+            if added and removed:
+                order_table = Order.__table__
+                moved = session.connection().execute(
+                    select(func.count()).where(order_table.c.customer_id == obj.id)
+                ).scalar()
+                deltas[seller_key(removed[0], CUSTOMERS)] -= 1
+                deltas[seller_key(added[0], CUSTOMERS)] += 1
+                deltas[seller_key(removed[0], ORDERS)] -= moved
+                deltas[seller_key(added[0], ORDERS)] += moved
+
+    if new_orders or deleted_orders:
+        customer_ids = {order.customer_id for order in new_orders + deleted_orders}
+        sellers = seller_ids_for_customers(session.connection(), customer_ids)
+        sellers.update(deleted_customer_sellers)
+        for orders, sign in ((new_orders, 1), (deleted_orders, -1)):
+            for order in orders:
+                seller_id = sellers.get(order.customer_id)
+                if seller_id is not None:
+                    deltas[seller_key(seller_id, ORDERS)] += sign
+    return deltas
+
+
+def _after_flush(session, flush_context):
+    deltas = _collect_deltas(session)
+    if deltas:
+        apply_deltas(session.connection(), deltas)
+
+
+def rebuild():
+    """Recompute every counter from the base tables in one transaction"""
+    deltas = Tally()
+    deltas[SELLERS] = User.query.filter_by(role='seller').count()
+    deltas[CUSTOMERS] = Customer.query.count()
+    deltas[ORDERS] = Order.query.count()
+
+    per_seller = db.session.query(Customer.seller_id, func.count(Customer.id)).group_by(Customer.seller_id)
+    for seller_id, count in per_seller:
+        deltas[seller_key(seller_id, CUSTOMERS)] = count
+    per_seller = db.session.query(Customer.seller_id, func.count(Order.id)).join(
+        Order, Order.customer_id == Customer.id
+    ).group_by(Customer.seller_id)
+    for seller_id, count in per_seller:
+        deltas[seller_key(seller_id, ORDERS)] = count
+
+    connection = db.session.connection()
+    # Other keys, such as the plan catalog version, are not counts and stay
+    table = Counter.__table__
+    connection.execute(table.delete().where(or_(
+        table.c.key.in_([SELLERS, CUSTOMERS, ORDERS]), table.c.key.like(seller_key('%', '%'))
+    )))
+    connection.execute(table.insert(), [
+        {'key': key, 'value': value} for key, value in deltas.items()
+    ])
+    db.session.commit()
+    return dict(deltas)
+
+
+def init_app(app):
+    if not event.contains(db.session, 'after_flush', _after_flush):
+        event.listen(db.session, 'after_flush', _after_flush)
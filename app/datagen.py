@@ -0,0 +1,178 @@
+"""Synthetic data at production-like volumes, for benchmarks and query plans.
+
+`generate()` adds N sellers with (on average) M customers each and K orders
+per customer. Customers are spread over sellers with Zipf-like skew, so a
+few sellers own most of the customers. Orders per customer follow an
+exponential distribution with creation dates spread over the past two years.
+
+Rows are inserted with plain Core executemany in fixed-size batches and explicit
+primary keys, so orders can point at their customers without a round trip.
+Each batch commits together with its counter deltas; the daily rollups are
+rebuilt once at the end. Generated usernames and emails carry a tag unique to
+the run, so they never collide with existing rows or earlier runs.
+"""
+import random
+import secrets
+from collections import Counter as Tally
+from datetime import datetime, timedelta
+from sqlalchemy import func, insert
+from app import db, counters, cache, catalog, rollups
+from app.models import User, Customer, Order, SubscriptionPlan
+from app.passwords import hash_password
+
+DEFAULT_PASSWORD = 'seller123'
+HISTORY_DAYS = 730
+
+PLANS = [
+    ('Basic', 'Basic subscription plan', 29.99, 30),
+    ('Premium', 'Premium subscription plan with all features', 49.99, 30),
+    ('Quarterly', 'Basic plan billed every three months', 79.99, 90),
+    ('Annual', 'Premium plan billed yearly', 499.99, 365),
+]
+# Most orders are on the cheaper plans
+PLAN_WEIGHTS = [50, 30, 15, 5]
+
+
+def _next_id(model):
+    return (db.session.query(func.max(model.id)).scalar() or 0) + 1
+
+
+def _run_tag():
+    while True:
+        tag = secrets.token_hex(3)
+        taken = db.session.query(User.id).filter(User.username.like(f'seller-{tag}-%')).first() or \
+            db.session.query(Customer.id).filter(Customer.email.like(f'customer-{tag}-%')).first()
+        if not taken:
+            return tag
+
+
+def _ensure_plans():
+    plans = db.session.query(SubscriptionPlan.id, SubscriptionPlan.duration_days).order_by(
+        SubscriptionPlan.id).all()
+    if not plans:
+        db.session.execute(insert(SubscriptionPlan), [
+            {'name': name, 'description': description, 'price': price, 'duration_days': days}
+            for name, description, price, days in PLANS
+        ])
+        catalog.changed(db.session)
+        db.session.commit()
+        plans = db.session.query(SubscriptionPlan.id, SubscriptionPlan.duration_days).order_by(
+            SubscriptionPlan.id).all()
+    return plans
+
+
+def _customer_counts(sellers, total, skew, rng):
+    # Zipf weights 1/rank^skew, shuffled so seller ids do not line up with size
+    weights = [1 / (rank ** skew) for rank in range(1, sellers + 1)]
+    rng.shuffle(weights)
+    scale = total / sum(weights)
+    return [max(1, round(weight * scale)) for weight in weights]
+
+
+def _order_status(end_date, now, rng):
+    if rng.random() < 0.03:
+        return 'Pending'
+    return 'Active' if end_date > now else 'Expired'
+
+
+def generate(sellers, customers_per_seller, orders_per_customer, skew=1.1, seed=None,
+             batch_size=5000, progress=None):
+    """Insert the synthetic data and return {'sellers': n, 'customers': n, 'orders': n}"""
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    plans = _ensure_plans()
+    plan_ids = [plan_id for plan_id, _ in plans]
+    plan_weights = PLAN_WEIGHTS if len(plan_ids) == len(PLAN_WEIGHTS) else None
+    durations = dict(plans)
+
+    # One hash for every generated seller; hashing each would dominate the run
+    password_hash = hash_password(DEFAULT_PASSWORD)
+    tag = _run_tag()
+    first_seller = _next_id(User)
+    db.session.execute(insert(User), [
+        {'id': first_seller + i, 'username': f'seller-{tag}-{i + 1}',
+         'email': f'seller-{tag}-{i + 1}@example.com', 'password_hash': password_hash, 'role': 'seller'}
+        for i in range(sellers)
+    ])
+    counters.apply_deltas(db.session.connection(), {counters.SELLERS: sellers})
+    db.session.commit()
+
+    customer_id = _next_id(Customer)
+    order_id = _next_id(Order)
+    customer_rows, order_rows, deltas = [], [], Tally()
+    totals = {'sellers': sellers, 'customers': 0, 'orders': 0}
+
+    def flush():
+        # Plain Core executemany (skips the ORM bulk path); customers first,
+        # since the orders in this batch reference them
+        connection = db.session.connection()
+        if customer_rows:
+            connection.execute(Customer.__table__.insert(), customer_rows)
+        if order_rows:
+            connection.execute(Order.__table__.insert(), order_rows)
+        counters.apply_deltas(connection, deltas)
+        cache.changed(db.session, everything=True)
+        db.session.commit()
+        customer_rows.clear()
+        order_rows.clear()
+        deltas.clear()
+        if progress:
+            progress(totals)
+
+    counts = _customer_counts(sellers, sellers * customers_per_seller, skew, rng)
+    for offset, count in enumerate(counts):
+        seller_id = first_seller + offset
+        for _ in range(count):
+            customer_rows.append({
+                'id': customer_id,
+                'name': f'Customer {customer_id}',
+                'email': f'customer-{tag}-{customer_id}@example.com',
+                'phone': f'{rng.randrange(10 ** 9, 10 ** 10)}',
+                'address': f'{rng.randrange(1, 999)} Main St',
+                'seller_id': seller_id,
+            })
+            deltas[counters.CUSTOMERS] += 1
+            deltas[counters.seller_key(seller_id, counters.CUSTOMERS)] += 1
+
+            orders = round(rng.expovariate(1 / orders_per_customer)) if orders_per_customer else 0
+            for _ in range(orders):
+                plan_id = rng.choices(plan_ids, plan_weights)[0]
+                created_at = now - timedelta(seconds=rng.randrange(HISTORY_DAYS * 86400))
+                end_date = created_at + timedelta(days=durations[plan_id])
+                order_rows.append({
+                    'id': order_id,
+                    'customer_id': customer_id,
+                    'plan_id': plan_id,
+                    'created_by': seller_id,
+                    'start_date': created_at,
+                    'end_date': end_date,
+                    'status': _order_status(end_date, now, rng),
+                    'created_at': created_at,
+                    'updated_at': created_at,
+                })
+                order_id += 1
+            deltas[counters.ORDERS] += orders
+            deltas[counters.seller_key(seller_id, counters.ORDERS)] += orders
+
+            customer_id += 1
+            totals['customers'] += 1
+            totals['orders'] += orders
+            if len(customer_rows) + len(order_rows) >= batch_size:
+                flush()
+
+    flush()
+    # One GROUP BY pass beats per-batch deltas spread over two years of days
+    rollups.rebuild()
+    _reset_sequences()
+    return totals
+
+
+def _reset_sequences():
+    # Explicit ids leave PostgreSQL's serial sequences behind
+    if db.engine.dialect.name == 'postgresql':
+        for table in ('users', 'customers', 'orders'):
+            db.session.execute(db.text(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                f"(SELECT coalesce(max(id), 1) FROM {table}))"
+            ))
+        db.session.commit()
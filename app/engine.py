@@ -0,0 +1,160 @@
+"""Database engine profile.
+
+`engine_options()` builds SQLALCHEMY_ENGINE_OPTIONS for the configured
+database. For PostgreSQL (and other server databases) it sizes the
+connection pool, pings connections before use and recycles them before
+server-side timeouts. For SQLite, `init_app` sets pragmas on every new
+connection: WAL journal so readers never block the writer, synchronous=NORMAL
+(safe with WAL), a larger page cache, memory-mapped reads and a busy
+timeout so concurrent writers wait instead of failing with "database is
+locked". A read replica (see app/replica.py) gets the profile for its own
+kind of database; a SQLite replica is also opened query-only.
+
+`flask db-stress` checks the profile with several processes writing at once
+to a scratch database.
+"""
+import os
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from app import db
+
+DEFAULT_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,        # ms to wait for the write lock
+    'cache_size': -64000,        # negative means KiB, so 64 MB
+    'mmap_size': 268435456,      # 256 MB
+    'temp_store': 'MEMORY',
+}
+
+
+def sqlite_pragmas(config):
+    return dict(DEFAULT_SQLITE_PRAGMAS, **config.get('SQLITE_PRAGMAS', {}))
+
+
+def engine_options(config, uri=None):
+    """SQLALCHEMY_ENGINE_OPTIONS for the configured database, or for the one at `uri`"""
+    url = make_url(uri or config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() == 'sqlite':
+        # pysqlite waits this long (seconds) for a lock when it opens a
+        # transaction; the busy_timeout pragma covers statements after that
+        return {'connect_args': {'timeout': sqlite_pragmas(config)['busy_timeout'] / 1000}}
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': True,
+        # Compiled SQL cache; the listing queries come in many filter shapes
+        'query_cache_size': config['DB_QUERY_CACHE_SIZE'],
+    }
+
+
+def _sqlite_pragmas(pragmas):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+    return on_connect
+
+
+def init_app(app):
+    from app.replica import REPLICA
+    with app.app_context():
+        engines = dict(db.engines)
+    for key, engine in engines.items():
+        if engine.dialect.name == 'sqlite':
+            pragmas = sqlite_pragmas(app.config)
+            if key == REPLICA:
+                # Anything that still tries to write there fails instead of forking the data
+                pragmas = dict(pragmas, query_only=1)
+            event.listen(engine, 'connect', _sqlite_pragmas(pragmas))
+
+
+def scratch_app(database_url):
+    """An app on `database_url` instead of the configured database, with its own in-process cache"""
+    from app import create_app
+    os.environ['DATABASE_URL'] = database_url
+    for name in ('DATABASE_REPLICA_URL', 'CACHE_URL'):
+        os.environ.pop(name, None)
+    return create_app()
+
+
+def stress_target():
+    """(seller id, plan id, plan duration) the stress writes use, or None if there is no seller or plan"""
+    from app.models import User, SubscriptionPlan
+    seller_id = db.session.query(User.id).filter_by(role='seller').order_by(User.id).limit(1).scalar()
+    plan = db.session.query(SubscriptionPlan.id, SubscriptionPlan.duration_days).order_by(
+        SubscriptionPlan.id).first()
+    if seller_id is None or plan is None:
+        return None
+    return (seller_id, *plan)
+
+
+def _stress_worker(database_url, target, worker, writes):
+    """Run in a child process: `writes` single-order transactions like create_order"""
+    from sqlalchemy.exc import OperationalError
+    from app.models import Customer, Order
+
+    app = scratch_app(database_url)
+    seller_id, plan_id, duration_days = target
+    latencies, errors = [], []
+    with app.app_context():
+        for i in range(writes):
+            start = time.perf_counter()
+            try:
+                customer = Customer(name=f'Stress {worker}-{i}', email=f'stress-{worker}-{i}@example.invalid',
+                                    seller_id=seller_id)
+                db.session.add(customer)
+                db.session.flush()
+                start_date = datetime.utcnow()
+                db.session.add(Order(customer_id=customer.id, plan_id=plan_id, start_date=start_date,
+                                     end_date=start_date + timedelta(days=duration_days),
+                                     status='Active', created_by=seller_id))
+                db.session.commit()
+                latencies.append(time.perf_counter() - start)
+            except OperationalError as e:
+                db.session.rollback()
+                errors.append(str(e.orig))
+    return latencies, errors
+
+
+def stress(database_url, target, writers, writes):
+    """Run `writers` processes doing `writes` commits each against `database_url`.
+
+    `target` comes from `stress_target()`. Returns (sorted latencies, error
+    messages, elapsed seconds).
+    """
+    from multiprocessing import get_context
+    
+    ctx = get_context('spawn')
+    start = time.perf_counter()
+    with ctx.Pool(writers) as pool:
+        results = pool.starmap(_stress_worker, [(database_url, target, worker, writes)
+                                                for worker in range(writers)])
+    elapsed = time.perf_counter() - start
+    latencies = sorted(latency for worker_latencies, _ in results for latency in worker_latencies)
+    errors = [error for _, worker_errors in results for error in worker_errors]
+    return latencies, errors, elapsed
+
+
+def cleanup_stress_rows():
+    """Delete the rows written by `stress` and recount the counters and rollups"""
+    from app import cache, counters, rollups
+    from app.models import Customer, Order
+
+    ids = db.session.query(Customer.id).filter(Customer.email.like('stress-%@example.invalid'))
+    db.session.query(Order).filter(Order.customer_id.in_(ids.scalar_subquery())).delete(
+        synchronize_session=False)
+    deleted = db.session.query(Customer).filter(Customer.email.like('stress-%@example.invalid')).delete(
+        synchronize_session=False)
+    if not deleted:
+        db.session.rollback()
+        return
+    cache.changed(db.session, everything=True)
+    db.session.commit()
+    counters.rebuild()
+    rollups.rebuild()
@@ -0,0 +1,67 @@
+"""Set-based order expiry.
+
+Expires every Active order whose end_date has passed with chunked UPDATE
+statements backed by the (status, end_date) index, instead of loading orders
+and calling Order.update_status on each one. Run it from `flask orders
+expire` (cron) or let create_app start the background thread by setting
+ORDER_EXPIRY_INTERVAL.
+"""
+import logging
+import threading
+from datetime import datetime
+from sqlalchemy import select
+from app import db, cache, rollups
+from app.models import Order
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+def expire_orders(now=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Mark overdue Active orders as Expired and return how many changed.
+
+    Each chunk is its own short transaction so a large backlog never holds
+    the write lock for long.
+    """
+    now = now or datetime.utcnow()
+    table = Order.__table__
+    total = 0
+    while True:
+        due = select(table.c.id).where(
+            table.c.status == 'Active', table.c.end_date < now
+        ).limit(chunk_size)
+        # RETURNING hands the rollups the expired orders without another query
+        expired = db.session.execute(
+            table.update().where(table.c.id.in_(due.scalar_subquery())).values(
+                status='Expired', updated_at=now
+            ).returning(table.c.customer_id, table.c.plan_id, table.c.end_date)
+        ).all()
+        if expired:
+            connection = db.session.connection()
+            rollups.apply_deltas(connection, rollups.expired_deltas(connection, expired))
+            # Statuses show on every dashboard
+            cache.changed(db.session, everything=True)
+        db.session.commit()
+        total += len(expired)
+        if len(expired) < chunk_size:
+            return total
+
+
+def start_scheduler(app, interval):
+    """Run expire_orders every `interval` seconds on a daemon thread"""
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(interval):
+            try:
+                with app.app_context():
+                    expired = expire_orders()
+                    if expired:
+                        logger.info('Expired %d orders', expired)
+            except Exception:
+                logger.exception('Order expiry run failed')
+
+    thread = threading.Thread(target=run, name='order-expiry', daemon=True)
+    thread.start()
+    return stop
@@ -0,0 +1,55 @@
+"""Query-plan check for the queries each route runs.
+
+`flask explain` prints the EXPLAIN (QUERY PLAN) output for every listing and
+dashboard query and flags steps that read a whole table instead of an index.
+"""
+from datetime import datetime
+from app import db
+from app.models import User, Customer, Order
+from app.queries import (admin_order_listing, seller_order_listing, customer_listing,
+                         keyset_query, encode_cursor, status_counts_query)
+
+
+def route_queries():
+    """(label, query) pairs shaped like the queries the routes issue"""
+    seller_id = db.session.query(User.id).filter_by(role='seller').limit(1).scalar() or 1
+    filters = {'status': 'Active', 'seller_id': seller_id,
+               'start_date': datetime(2000, 1, 1), 'end_date': None}
+    cursor = encode_cursor(datetime.utcnow(), 0)
+
+    return [
+        ('auth.login', User.query.filter_by(email='admin@example.com')),
+        ('admin.dashboard recent orders',
+         admin_order_listing().order_by(Order.created_at.desc()).limit(5)),
+        ('admin.sellers', User.query.filter_by(role='seller').order_by(User.username).limit(10)),
+        ('admin.customers', customer_listing().limit(25)),
+        ('admin.customers filtered', customer_listing(search='smith', seller_id=seller_id).limit(25)),
+        ('admin.orders first page', keyset_query(admin_order_listing(), limit=26)),
+        ('admin.orders next page filtered', keyset_query(admin_order_listing(filters), cursor, limit=26)),
+        ('admin.orders status counts', status_counts_query(filters)),
+        ('seller.dashboard recent orders',
+         seller_order_listing(seller_id).order_by(Order.created_at.desc()).limit(5)),
+        ('seller.customers', Customer.query.filter_by(seller_id=seller_id)),
+        ('seller.orders', seller_order_listing(seller_id).order_by(Order.created_at.desc())),
+        ('orders expire', Order.query.filter(Order.status == 'Active',
+                                             Order.end_date < datetime.utcnow()).limit(1000)),
+    ]
+
+
+def explain(query):
+    """Return the plan lines for `query` and the lines that are full table scans"""
+    dialect = db.engine.dialect
+    sql = str(query.statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+
+    if dialect.name == 'sqlite':
+        rows = db.session.execute(db.text(f'EXPLAIN QUERY PLAN {sql}')).all()
+        lines = [row[3] for row in rows]
+        # "SCAN orders" reads the table; "SCAN orders USING INDEX ..." does not,
+        # and a virtual-table scan with an index plan is an FTS lookup
+        full_scan = [line for line in lines if line.startswith('SCAN ')
+                     and ' USING ' not in line and 'VIRTUAL TABLE INDEX' not in line]
+    else:
+        rows = db.session.execute(db.text(f'EXPLAIN {sql}')).all()
+        lines = [row[0] for row in rows]
+        full_scan = [line for line in lines if 'Seq Scan' in line]
+    return lines, full_scan
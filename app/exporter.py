@@ -0,0 +1,86 @@
+"""Streaming CSV / JSON Lines exports.
+
+Exports select plain columns (no ORM entities) and read them through a
+server-side cursor with yield_per, handing rows to a generator that the
+route wraps in a streaming Response. Neither the query result nor the
+encoded output is ever held in memory as a whole. Plan names come from the
+in-process catalog, as in the listings.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from app import db
+from app.catalog import get_plan
+from app.models import User, Customer, Order
+from app.queries import apply_customer_filters, apply_order_filters
+
+FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+BATCH_SIZE = 1000
+
+CUSTOMER_FIELDS = ['id', 'name', 'email', 'phone', 'address', 'seller']
+ORDER_FIELDS = ['id', 'customer', 'customer_email', 'plan', 'seller', 'status',
+                'start_date', 'end_date', 'created_at']
+
+
+def customer_rows(search=None, seller_id=None):
+    query = db.session.query(
+        Customer.id, Customer.name, Customer.email, Customer.phone, Customer.address,
+        User.username
+    ).join(User, Customer.seller_id == User.id)
+    query = apply_customer_filters(query, search, seller_id)
+    return query.order_by(Customer.id).yield_per(BATCH_SIZE)
+
+
+def order_rows(filters):
+    query = db.session.query(
+        Order.id, Customer.name, Customer.email, Order.plan_id, User.username,
+        Order.status, Order.start_date, Order.end_date, Order.created_at
+    )
+    query = query.join(Customer, Order.customer_id == Customer.id)
+    query = query.join(User, Customer.seller_id == User.id)
+    query = apply_order_filters(query, **filters)
+    rows = query.order_by(Order.created_at.desc(), Order.id.desc()).yield_per(BATCH_SIZE)
+    for order_id, customer, email, plan_id, *rest in rows:
+        plan = get_plan(plan_id)
+        yield (order_id, customer, email, plan.name if plan else None, *rest)
+
+
+def _jsonable(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def iter_csv(fields, rows):
+    # Encode a batch of rows per chunk rather than one tiny chunk per row
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if count % BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_jsonl(fields, rows):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps({field: _jsonable(value) for field, value in zip(fields, row)}))
+        if len(lines) == BATCH_SIZE:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def iter_export(fmt, fields, rows):
+    return iter_jsonl(fields, rows) if fmt == 'jsonl' else iter_csv(fields, rows)
+
+
+def filename(name, fmt):
+    return f'{name}_{datetime.utcnow():%Y%m%d_%H%M%S}.{fmt}'
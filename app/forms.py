@@ -0,0 +1,40 @@
+from datetime import date
+from flask_wtf import FlaskForm
+from wtforms import StringField, TextAreaField, SubmitField, SelectField, RadioField, IntegerField, DateField
+from wtforms.validators import DataRequired, Length, Email, Optional, ValidationError
+from app import db
+from app.models import Customer, MAX_ID
+
+class CustomerForm(FlaskForm):
+    name = StringField('Full Name', validators=[DataRequired(), Length(max=100)])
+    email = StringField('Email', validators=[DataRequired(), Email(), Length(max=120)])
+    phone = StringField('Phone', validators=[Optional(), Length(max=20)])
+    address = TextAreaField('Address', validators=[Optional()])
+    submit = SubmitField('Save Customer')
+
+    def validate_email(self, email):
+        if db.session.query(Customer.id).filter_by(email=email.data).first():
+            raise ValidationError('A customer with this email already exists.')
+
+class OrderForm(FlaskForm):
+    # Picked through the typeahead lookup, so there is no list of choices to
+    # build; validate_customer_id checks the one submitted id instead
+    customer_id = IntegerField('Customer', validators=[DataRequired(message='Please select a customer.')])
+    plan_id = RadioField('Subscription Plan', coerce=int, validators=[DataRequired()])
+    start_date = DateField('Start Date', default=date.today, validators=[DataRequired()])
+    payment_status = SelectField('Payment Status', choices=[('Paid', 'Paid'), ('Pending', 'Pending')])
+    notes = TextAreaField('Notes', validators=[Optional(), Length(max=500)])
+    submit = SubmitField('Create Order')
+
+    def __init__(self, seller_id, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.seller_id = seller_id
+
+    def validate_customer_id(self, customer_id):
+        if customer_id.data is None or not 0 < customer_id.data <= MAX_ID:
+            raise ValidationError('Invalid customer selected.')
+        owned = db.session.query(Customer.id).filter_by(
+            id=customer_id.data, seller_id=self.seller_id
+        ).first()
+        if not owned:
+            raise ValidationError('Invalid customer selected.')
@@ -0,0 +1,116 @@
+"""Cached user identity for Flask-Login.
+
+Every authenticated request asks the user loader for `current_user`, and the
+role decorators only need the user's id, username, email and role. Those are
+kept in a small in-process TTL + LRU cache, so a page view does not need a
+primary-key SELECT on users. Writes to a user (including deletes) drop the
+cached entry once the transaction commits. Other processes see the change
+when their entry expires, after at most USER_CACHE_TTL seconds.
+"""
+import threading
+import time
+from collections import OrderedDict
+from flask_login import UserMixin
+from sqlalchemy import event
+from app import db
+from app.models import User
+
+DEFAULT_TTL = 60
+DEFAULT_SIZE = 1024
+
+
+class Identity(UserMixin):
+    """Read-only stand-in for a User row, safe to share between requests"""
+    __slots__ = ('id', 'username', 'email', 'role')
+
+    def __init__(self, id, username, email, role):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.role = role
+
+    def is_admin(self):
+        return self.role == 'admin'
+
+    def __repr__(self):
+        return f'<Identity {self.username} ({self.role})>'
+
+
+class IdentityCache:
+    def __init__(self, ttl=DEFAULT_TTL, maxsize=DEFAULT_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict()  # user id -> (expires, Identity or None)
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return False, None
+            if entry[0] < time.monotonic():
+                del self._entries[user_id]
+                return False, None
+            self._entries.move_to_end(user_id)
+            return True, entry[1]
+
+    def put(self, user_id, identity):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, identity)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+
+cache = IdentityCache()
+
+
+def load_identity(user_id):
+    """Return the Identity for `user_id`, or None if there is no such user"""
+    found, identity = cache.get(user_id)
+    if found:
+        return identity
+
+    row = db.session.query(User.id, User.username, User.email, User.role).filter(
+        User.id == user_id
+    ).first()
+    identity = Identity(*row) if row else None
+    # Unknown ids are cached too, so a stale session cookie costs one query
+    cache.put(user_id, identity)
+    return identity
+
+
+def _after_flush(session, flush_context):
+    changed = {obj.id for obj in list(session.dirty) + list(session.deleted)
+               if isinstance(obj, User) and obj.id is not None}
+    if changed:
+        # Drop now so this process never serves the old row, and again on
+        # commit in case another request reloaded it in between
+        for user_id in changed:
+            cache.invalidate(user_id)
+        session.info.setdefault('identity_changed', set()).update(changed)
+
+
+def _after_commit(session):
+    for user_id in session.info.pop('identity_changed', ()):
+        cache.invalidate(user_id)
+
+
+def _after_rollback(session):
+    session.info.pop('identity_changed', None)
+
+
+def init_app(app):
+    cache.ttl = app.config.get('USER_CACHE_TTL', DEFAULT_TTL)
+    cache.maxsize = app.config.get('USER_CACHE_SIZE', DEFAULT_SIZE)
+    for name, listener in (('after_flush', _after_flush), ('after_commit', _after_commit),
+                           ('after_rollback', _after_rollback)):
+        if not event.contains(db.session, name, listener):
+            event.listen(db.session, name, listener)
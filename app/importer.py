@@ -0,0 +1,158 @@
+"""Streaming bulk import of customers from CSV.
+
+Rows are read one at a time and handled in fixed-size chunks: each chunk is
+validated, checked against existing customer emails and resolved to sellers
+with one set-based query apiece, then inserted with a single executemany and
+committed. Memory use is bounded by the batch size, not the file size.
+Emails are compared case-insensitively. If a chunk still hits a constraint
+(a customer added meanwhile, a seller deleted), that chunk is retried row by
+row so only the offending rows are rejected.
+"""
+import csv
+from itertools import islice
+from email_validator import validate_email, EmailNotValidError
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import IntegrityError
+from app import db, counters, cache
+from app.models import User, Customer
+
+CSV_COLUMNS = ['Name', 'Email', 'Phone', 'Address', 'Seller']
+DEFAULT_BATCH_SIZE = 1000
+
+
+class ImportReport:
+    def __init__(self, max_errors=1000):
+        self.inserted = 0
+        self.rejected = 0
+        self.errors = []  # (line number, message), capped at max_errors
+        self.max_errors = max_errors
+
+    def reject(self, line, message):
+        self.rejected += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append((line, message))
+
+    def to_dict(self):
+        return {
+            'inserted': self.inserted,
+            'rejected': self.rejected,
+            'errors': [{'line': line, 'message': message} for line, message in self.errors],
+            'errors_truncated': self.rejected > len(self.errors),
+        }
+
+
+def import_customers(lines, default_seller_id=None, batch_size=DEFAULT_BATCH_SIZE, max_errors=1000,
+                     progress=None):
+    """Import customers from an iterable of CSV lines and return an ImportReport.
+
+    The header row must contain Name and Email; Phone, Address and Seller
+    (a seller username) are optional. Rows without a Seller are assigned to
+    `default_seller_id`, which must be a seller. `progress`, if given, is
+    called with the report after each chunk.
+    """
+    reader = csv.DictReader(lines)
+    report = ImportReport(max_errors=max_errors)
+    if reader.fieldnames is None:
+        return report
+
+    reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+    missing = {'name', 'email'} - set(reader.fieldnames)
+    if missing:
+        report.reject(1, f'Missing required column(s): {", ".join(sorted(missing))}')
+        return report
+    if default_seller_id is not None and not db.session.execute(
+            select(User.id).where(User.id == default_seller_id, User.role == 'seller')).first():
+        report.reject(1, f'Unknown default seller #{default_seller_id}')
+        return report
+
+    seller_ids = {}  # username -> id, shared across chunks
+    rows = enumerate(reader, start=2)  # line 1 is the header
+    while True:
+        chunk = list(islice(rows, batch_size))
+        if not chunk:
+            report.errors.sort()
+            return report
+        _import_chunk(chunk, default_seller_id, seller_ids, report)
+        if progress:
+            progress(report)
+
+
+def _import_chunk(chunk, default_seller_id, seller_ids, report):
+    candidates = []
+    for line, row in chunk:
+        name = (row.get('name') or '').strip()
+        email = (row.get('email') or '').strip()
+        if not name or not email:
+            report.reject(line, 'Name and email are required')
+            continue
+        try:
+            email = validate_email(email, check_deliverability=False).normalized
+        except EmailNotValidError as e:
+            report.reject(line, f'Invalid email {email!r}: {e}')
+            continue
+        candidates.append((line, row, name, email))
+
+    # Resolve any seller usernames not seen in earlier chunks in one query
+    usernames = {(row.get('seller') or '').strip() for _, row, _, _ in candidates} - {''}
+    unknown = usernames - seller_ids.keys()
+    if unknown:
+        seller_ids.update(db.session.execute(
+            select(User.username, User.id).where(User.username.in_(unknown), User.role == 'seller')
+        ).all())
+
+    # One lookup for every email in the chunk that already exists, ignoring case
+    emails = {email.lower() for _, _, _, email in candidates}
+    existing = set(db.session.execute(
+        select(func.lower(Customer.email)).where(func.lower(Customer.email).in_(emails))
+    ).scalars()) if emails else set()
+
+    lines, mappings = [], []
+    for line, row, name, email in candidates:
+        username = (row.get('seller') or '').strip()
+        seller_id = seller_ids.get(username) if username else default_seller_id
+        if seller_id is None:
+            message = f'Unknown seller {username!r}' if username else 'No seller given'
+            report.reject(line, message)
+            continue
+        if email.lower() in existing:
+            report.reject(line, f'Duplicate email {email}')
+            continue
+        existing.add(email.lower())
+        lines.append(line)
+        mappings.append({
+            'name': name[:100],
+            'email': email,
+            'phone': (row.get('phone') or '').strip()[:20] or None,
+            'address': (row.get('address') or '').strip() or None,
+            'seller_id': seller_id,
+        })
+
+    if not mappings:
+        return
+    try:
+        _insert(mappings)
+    except IntegrityError:
+        db.session.rollback()
+        # Something the lookups above could not see; find the rows it affects
+        for line, mapping in zip(lines, mappings):
+            try:
+                _insert([mapping])
+            except IntegrityError as e:
+                db.session.rollback()
+                report.reject(line, f'Could not insert {mapping["email"]}: {e.orig}')
+            else:
+                report.inserted += 1
+    else:
+        report.inserted += len(mappings)
+
+
+def _insert(mappings):
+    # executemany bypasses the flush events, so bump the counters here
+    db.session.execute(insert(Customer), mappings)
+    deltas = {counters.CUSTOMERS: len(mappings)}
+    for mapping in mappings:
+        key = counters.seller_key(mapping['seller_id'], counters.CUSTOMERS)
+        deltas[key] = deltas.get(key, 0) + 1
+    counters.apply_deltas(db.session.connection(), deltas)
+    cache.changed(db.session, {mapping['seller_id'] for mapping in mappings})
+    db.session.commit()
@@ -0,0 +1,195 @@
+"""Per-request SQL and rendering instrumentation.
+
+For every request this counts the SQL statements and their total time,
+measures template rendering, and remembers the slowest statements. The
+numbers are reported three ways:
+
+* a `Server-Timing` response header, shown in the browser's network panel
+* one JSON log line per request on the `app.perf` logger
+* per-endpoint percentiles on the admin-only /admin/perf page
+
+Samples are kept in memory, per process, in bounded ring buffers.
+"""
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from flask import (current_app, g, has_request_context, request, before_render_template,
+                   template_rendered)
+from sqlalchemy import event
+from app import db
+
+logger = logging.getLogger('app.perf')
+
+SLOWEST_PER_REQUEST = 3
+SQL_PREVIEW = 300  # characters of each statement kept
+
+
+class RequestStats:
+    __slots__ = ('started', 'queries', 'db_time', 'render_time', 'render_stack', 'slowest')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+        self.render_stack = []
+        self.slowest = []  # (seconds, statement), longest first
+
+    def add_query(self, duration, statement):
+        self.queries += 1
+        self.db_time += duration
+        if len(self.slowest) < SLOWEST_PER_REQUEST or duration > self.slowest[-1][0]:
+            self.slowest.append((duration, statement[:SQL_PREVIEW]))
+            self.slowest.sort(key=lambda item: -item[0])
+            del self.slowest[SLOWEST_PER_REQUEST:]
+
+
+class Recorder:
+    """Bounded per-endpoint samples and a log of slow statements"""
+
+    def __init__(self, samples=500, slow_log=50):
+        self._samples = defaultdict(lambda: deque(maxlen=samples))
+        self._slow = deque(maxlen=slow_log)
+        self._lock = threading.Lock()
+
+    def add(self, endpoint, total_ms, db_ms, render_ms, queries):
+        with self._lock:
+            self._samples[endpoint].append((total_ms, db_ms, render_ms, queries))
+
+    def add_slow(self, endpoint, ms, statement):
+        with self._lock:
+            self._slow.appendleft({'endpoint': endpoint, 'ms': ms, 'statement': statement,
+                                   'at': time.strftime('%Y-%m-%d %H:%M:%S')})
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._slow.clear()
+
+    def summary(self):
+        """Per-endpoint percentiles, slowest p95 first"""
+        with self._lock:
+            samples = {endpoint: list(values) for endpoint, values in self._samples.items()}
+        rows = []
+        for endpoint, values in samples.items():
+            total = sorted(value[0] for value in values)
+            db_ms = sorted(value[1] for value in values)
+            queries = [value[3] for value in values]
+            rows.append({
+                'endpoint': endpoint,
+                'requests': len(values),
+                'p50': percentile(total, 50),
+                'p95': percentile(total, 95),
+                'p99': percentile(total, 99),
+                'db_p95': percentile(db_ms, 95),
+                'render_avg': sum(value[2] for value in values) / len(values),
+                'queries_avg': sum(queries) / len(queries),
+                'queries_max': max(queries),
+            })
+        return sorted(rows, key=lambda row: -row['p95'])
+
+    def slow_statements(self):
+        with self._lock:
+            return list(self._slow)
+
+
+def percentile(sorted_values, pct):
+    # Nearest-rank percentile
+    index = max(0, -(-len(sorted_values) * pct // 100) - 1)
+    return sorted_values[index]
+
+
+recorder = Recorder()
+
+
+def _stats():
+    if has_request_context():
+        return g.get('perf')
+    return None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['query_started'] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _stats()
+    if stats is not None:
+        stats.add_query(time.perf_counter() - conn.info['query_started'], statement)
+
+
+def _before_render(sender, template, context, **extra):
+    stats = _stats()
+    if stats is not None:
+        stats.render_stack.append(time.perf_counter())
+
+
+def _after_render(sender, template, context, **extra):
+    stats = _stats()
+    if stats is not None and stats.render_stack:
+        started = stats.render_stack.pop()
+        if not stats.render_stack:
+            # Only the outermost render; nested ones are already inside it
+            stats.render_time += time.perf_counter() - started
+
+
+def _start_request():
+    g.perf = RequestStats()
+
+
+def _finish_request(response):
+    stats = g.pop('perf', None)
+    if stats is None:
+        return response
+
+    total_ms = (time.perf_counter() - stats.started) * 1000
+    db_ms = stats.db_time * 1000
+    render_ms = stats.render_time * 1000
+    endpoint = request.endpoint or 'unmatched'
+
+    response.headers['Server-Timing'] = (
+        f'db;dur={db_ms:.1f};desc="{stats.queries} queries", '
+        f'render;dur={render_ms:.1f}, app;dur={total_ms:.1f}'
+    )
+    if endpoint != 'static':
+        recorder.add(endpoint, total_ms, db_ms, render_ms, stats.queries)
+
+    slow_ms = current_app.config['SLOW_QUERY_MS']
+    for duration, statement in stats.slowest:
+        if duration * 1000 >= slow_ms:
+            recorder.add_slow(endpoint, duration * 1000, statement)
+
+    if current_app.config['PERF_LOG']:
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'endpoint': endpoint,
+            'status': response.status_code,
+            'ms': round(total_ms, 1),
+            'db_ms': round(db_ms, 1),
+            'render_ms': round(render_ms, 1),
+            'queries': stats.queries,
+            'slowest': [{'ms': round(duration * 1000, 1), 'sql': statement}
+                        for duration, statement in stats.slowest],
+        }))
+    return response
+
+
+def init_app(app):
+    if app.config['PERF_LOG']:
+        # app.perf propagates to app.logger, which brings Flask's default handler
+        app.logger
+        logger.setLevel(logging.INFO)
+
+    with app.app_context():
+        engines = list(db.engines.values())
+    # The primary and, if configured, the read replica
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
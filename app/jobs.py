@@ -0,0 +1,478 @@
+"""Background jobs: a queue in the `jobs` table and a pool of worker processes.
+
+Work that would hold a request for minutes (imports, exports, renewal runs,
+reports) is queued with `enqueue`, which adds a row and returns at once.
+`flask jobs work` runs worker processes that each claim the oldest due job
+with a single UPDATE ... RETURNING, so two workers never run the same job
+and no broker is needed: the database is the queue.
+
+A handler is called with a JobContext and the job's params. It reports
+progress through `context.progress()`, which raises JobCancelled once an
+admin has asked for the job to stop. A job that raises is retried with
+exponential backoff until it runs out of attempts; a job whose worker died
+(no heartbeat for JOB_STALE_AFTER seconds) goes back in the queue. Files a
+job reads or writes live in JOBS_DIR.
+
+Workers write their bookkeeping (claims, progress, heartbeats, results) in
+short transactions of their own on the engine, never through the session,
+so it neither commits nor rolls back the handler's work.
+"""
+import json
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import socket
+import threading
+import time
+import traceback
+import uuid
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from flask import current_app
+from sqlalchemy import func, select
+from app import db
+from app.instrumentation import percentile
+from app.models import Job
+from app.replica import replica_reads
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = 'queued', 'running', 'succeeded', 'failed', 'cancelled'
+STATUSES = (QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED)
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+PROGRESS_INTERVAL = 1.0  # seconds between progress writes
+ERROR_PREVIEW = 4000  # characters of a traceback kept
+METRICS_SAMPLE = 5000  # most recent finished jobs the timings are taken from
+WORKER_LOST = 'Worker stopped sending heartbeats'
+
+# kind -> handler function, and the kinds that must not run twice
+HANDLERS = {}
+NO_RETRY = set()
+
+
+def handler(kind, retry=True):
+    """Register the decorated function as the handler for jobs of `kind`.
+
+    Jobs of a kind registered with retry=False get a single attempt, for
+    work that is not safe to repeat after a partial run.
+    """
+    def register(function):
+        HANDLERS[kind] = function
+        if not retry:
+            NO_RETRY.add(kind)
+        return function
+    return register
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _update(engine, job_id, values, *conditions):
+    """UPDATE one job in its own transaction; returns its cancel_requested, or None if no row matched"""
+    table = Job.__table__
+    with engine.begin() as connection:
+        return connection.execute(table.update().where(table.c.id == job_id, *conditions).values(values)
+                                  .returning(table.c.cancel_requested)).scalar()
+
+
+class JobContext:
+    """What a handler gets: its job id, a place for files and the progress hook"""
+
+    def __init__(self, engine, job_id, attempt, directory):
+        self.engine = engine
+        self.job_id = job_id
+        self.attempt = attempt
+        self.directory = directory
+        self.cancelled = threading.Event()  # set by progress() or the heartbeat
+        self._last_write = 0.0
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def progress(self, done, total=None, message=None, force=False):
+        """Record how far the job has got and raise JobCancelled if asked to stop.
+
+        Writes at most once per PROGRESS_INTERVAL unless `force` is set, so
+        handlers can call it for every chunk.
+        """
+        now = time.monotonic()
+        if force or now - self._last_write >= PROGRESS_INTERVAL:
+            self._last_write = now
+            values = {'progress': done, 'heartbeat_at': datetime.utcnow()}
+            if total is not None:
+                values['total'] = total
+            if message is not None:
+                values['message'] = message[:255]
+            if _update(self.engine, self.job_id, values):
+                self.cancelled.set()
+        if self.cancelled.is_set():
+            raise JobCancelled()
+
+
+def jobs_dir():
+    directory = current_app.config['JOBS_DIR']
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def save_upload(upload, suffix='.csv'):
+    """Save an uploaded file for a job to read later; returns its name in JOBS_DIR"""
+    name = f'upload-{uuid.uuid4().hex}{suffix}'
+    upload.save(os.path.join(jobs_dir(), name))
+    return name
+
+
+def enqueue(kind, params=None, created_by=None):
+    """Queue a job of a registered kind and return it. Commits the session."""
+    if kind not in HANDLERS:
+        raise ValueError(f'Unknown job kind {kind!r}')
+    job = Job(kind=kind, params=params or {}, created_by=created_by,
+              max_attempts=1 if kind in NO_RETRY else current_app.config['JOB_MAX_ATTEMPTS'])
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def cancel(job_id):
+    """Cancel a queued job, or ask a running one to stop at its next progress call.
+
+    Returns False if the job has already finished (or does not exist).
+    """
+    table = Job.__table__
+    cancelled = db.session.execute(table.update().where(
+        table.c.id == job_id, table.c.status == QUEUED
+    ).values(status=CANCELLED, finished_at=datetime.utcnow())).rowcount
+    if not cancelled:
+        cancelled = db.session.execute(table.update().where(
+            table.c.id == job_id, table.c.status == RUNNING
+        ).values(cancel_requested=True)).rowcount
+    db.session.commit()
+    return bool(cancelled)
+
+
+def claim(worker, now=None):
+    """Mark the oldest due job as running for `worker` and return its row, or None"""
+    now = now or datetime.utcnow()
+    table = Job.__table__
+    due = select(table.c.id).where(table.c.status == QUEUED, table.c.run_at <= now).order_by(
+        table.c.run_at, table.c.id
+    ).limit(1).scalar_subquery()
+    with db.engine.begin() as connection:
+        # The outer status check makes a job another worker took in the
+        # meantime match nothing; the caller just polls again
+        return connection.execute(table.update().where(table.c.id == due, table.c.status == QUEUED).values(
+            status=RUNNING, attempts=table.c.attempts + 1, worker=worker, started_at=now,
+            heartbeat_at=now, finished_at=None
+        ).returning(table.c.id, table.c.kind, table.c.params, table.c.attempts, table.c.max_attempts)).first()
+
+
+def recover_stale(stale_after, now=None):
+    """Requeue running jobs whose worker went silent; fail or cancel them when they should not run again"""
+    now = now or datetime.utcnow()
+    table = Job.__table__
+    stale = (table.c.status == RUNNING, table.c.heartbeat_at < now - timedelta(seconds=stale_after))
+    recovered = 0
+    with db.engine.begin() as connection:
+        for condition, values in (
+                (table.c.cancel_requested, {'status': CANCELLED, 'finished_at': now}),
+                (table.c.attempts >= table.c.max_attempts, {'status': FAILED, 'finished_at': now}),
+                (None, {'status': QUEUED, 'run_at': now, 'worker': None})):
+            query = table.update().where(*stale)
+            if condition is not None:
+                query = query.where(condition)
+            recovered += connection.execute(query.values(error=WORKER_LOST, **values)).rowcount
+    return recovered
+
+
+def _heartbeat(context, interval, done):
+    # Keeps a job that reports no progress for a while from looking dead
+    while not done.wait(interval):
+        try:
+            if _update(context.engine, context.job_id, {'heartbeat_at': datetime.utcnow()}):
+                context.cancelled.set()
+        except Exception:
+            logger.exception('Heartbeat for job %d failed', context.job_id)
+
+
+def run_job(row, worker):
+    """Run a claimed job to the end and record the outcome; returns the job's new status"""
+    config = current_app.config
+    engine = db.engine
+    context = JobContext(engine, row.id, row.attempts, jobs_dir())
+    function = HANDLERS.get(row.kind)
+    done = threading.Event()
+    beat = threading.Thread(target=_heartbeat, args=(context, config['JOB_STALE_AFTER'] / 4, done),
+                            name=f'job-{row.id}-heartbeat', daemon=True)
+    beat.start()
+    started = time.perf_counter()
+    try:
+        if function is None:
+            raise LookupError(f'No handler for job kind {row.kind!r}')
+        result = function(context, **row.params)
+        status, values = SUCCEEDED, {'result': result}
+    except JobCancelled:
+        status, values = CANCELLED, {}
+    except Exception:
+        logger.exception('Job %d (%s) failed on attempt %d', row.id, row.kind, row.attempts)
+        values = {'error': traceback.format_exc()[-ERROR_PREVIEW:]}
+        if function and row.attempts < row.max_attempts and not context.cancelled.is_set():
+            delay = config['JOB_RETRY_DELAY'] * 2 ** (row.attempts - 1)
+            status = QUEUED
+            values.update(run_at=datetime.utcnow() + timedelta(seconds=delay), worker=None)
+        else:
+            status = FAILED
+    finally:
+        done.set()
+        beat.join()
+        # Whatever the handler left in the session is not part of the outcome
+        db.session.close()
+
+    if status != QUEUED:
+        values['finished_at'] = datetime.utcnow()
+    # Unless the job was recovered as stale meanwhile and is now someone else's
+    _update(engine, row.id, dict(values, status=status), Job.__table__.c.worker == worker,
+            Job.__table__.c.status == RUNNING)
+    logger.info('Job %d (%s) %s after %.1fs', row.id, row.kind,
+                'will be retried' if status == QUEUED else status, time.perf_counter() - started)
+    return status
+
+
+def work(stop, once=False, worker=None):
+    """Claim and run jobs until `stop` is set, or with `once` until none is due; returns how many ran"""
+    config = current_app.config
+    worker = worker or f'{socket.gethostname()}:{os.getpid()}'
+    ran = 0
+    last_recovery = 0.0
+    while not stop.is_set():
+        if time.monotonic() - last_recovery >= config['JOB_STALE_AFTER'] / 2:
+            recovered = recover_stale(config['JOB_STALE_AFTER'])
+            if recovered:
+                logger.warning('Recovered %d jobs from unresponsive workers', recovered)
+            last_recovery = time.monotonic()
+        row = claim(worker)
+        if row is None:
+            if once:
+                break
+            stop.wait(config['JOB_POLL_INTERVAL'])
+            continue
+        run_job(row, worker)
+        ran += 1
+    return ran
+
+
+def _process_main(stop, once):
+    # Entry point of a pool process. Spawned, not forked, so it builds its
+    # own app and engine instead of sharing the parent's connections
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl-C reaches the parent, which sets stop
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(processName)s %(message)s')
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        work(stop, once)
+
+
+def run_pool(processes, once=False):
+    """Run `processes` worker processes until interrupted (or, with `once`, until the queue is empty).
+
+    A worker that crashes is replaced. Ctrl-C or SIGTERM lets every worker
+    finish its current job before the pool exits.
+    """
+    context = multiprocessing.get_context('spawn')
+    stop = context.Event()
+
+    def start(number):
+        process = context.Process(target=_process_main, args=(stop, once), name=f'jobs-worker-{number}')
+        process.start()
+        return process
+
+    pool = [start(number) for number in range(1, processes + 1)]
+    previous = signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    try:
+        while pool:
+            try:
+                multiprocessing.connection.wait([process.sentinel for process in pool])
+            except KeyboardInterrupt:
+                stop.set()
+                continue
+            for process in [process for process in pool if not process.is_alive()]:
+                pool.remove(process)
+                if process.exitcode != 0 and not stop.is_set() and not once:
+                    logger.warning('%s exited with code %s; starting a new one', process.name, process.exitcode)
+                    pool.append(start(int(process.name.rsplit('-', 1)[1])))
+    finally:
+        signal.signal(signal.SIGTERM, previous)
+
+
+def _seconds(start, end):
+    return (end - start).total_seconds() if start and end else None
+
+
+def job_dict(job):
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'progress': job.progress,
+        'total': job.total,
+        'message': job.message,
+        'result': job.result,
+        'error': job.error,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'cancel_requested': job.cancel_requested,
+        'created_at': job.created_at and job.created_at.isoformat(),
+        'started_at': job.started_at and job.started_at.isoformat(),
+        'finished_at': job.finished_at and job.finished_at.isoformat(),
+        'run_seconds': _seconds(job.started_at,
+                                job.finished_at or (datetime.utcnow() if job.status == RUNNING else None)),
+    }
+
+
+def metrics():
+    """Per-kind job counts by status, with run and queue-wait percentiles of recent finished jobs"""
+    kinds = defaultdict(lambda: {'counts': dict.fromkeys(STATUSES, 0), 'run': [], 'wait': [], 'retried': 0})
+    for kind, status, count in db.session.execute(
+            select(Job.kind, Job.status, func.count()).group_by(Job.kind, Job.status)):
+        kinds[kind]['counts'][status] = count
+
+    # run_at is when the latest attempt became due, so the wait excludes retry backoff
+    for kind, attempts, run_at, started_at, finished_at in db.session.execute(select(
+            Job.kind, Job.attempts, Job.run_at, Job.started_at, Job.finished_at
+    ).where(Job.status.in_(FINISHED), Job.started_at.isnot(None)).order_by(Job.id.desc()).limit(METRICS_SAMPLE)):
+        kinds[kind]['run'].append(_seconds(started_at, finished_at) or 0.0)
+        kinds[kind]['wait'].append(max(_seconds(run_at, started_at) or 0.0, 0.0))
+        kinds[kind]['retried'] += attempts > 1
+
+    rows = []
+    for kind, values in sorted(kinds.items()):
+        run, wait = sorted(values['run']), sorted(values['wait'])
+        rows.append({
+            'kind': kind,
+            **values['counts'],
+            'sampled': len(run),
+            'retried': values['retried'],
+            'run_p50': percentile(run, 50) if run else None,
+            'run_p95': percentile(run, 95) if run else None,
+            'run_max': run[-1] if run else None,
+            'wait_p50': percentile(wait, 50) if wait else None,
+            'wait_p95': percentile(wait, 95) if wait else None,
+        })
+    return rows
+
+
+def _files(params, result):
+    return [name for name in ((params or {}).get('upload'), (result or {}).get('file')) if name]
+
+
+def prune(days):
+    """Delete jobs that finished more than `days` days ago, with their files; returns how many"""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    rows = db.session.execute(select(Job.id, Job.params, Job.result).where(
+        Job.status.in_(FINISHED), Job.finished_at < cutoff
+    )).all()
+    directory = jobs_dir()
+    for _, params, result in rows:
+        for name in _files(params, result):
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+    if rows:
+        db.session.execute(Job.__table__.delete().where(Job.__table__.c.id.in_([row.id for row in rows])))
+    db.session.commit()
+    return len(rows)
+
+
+# Handlers. Their imports are deferred so the web processes, which only
+# enqueue, never load the importer's email_validator or NumPy
+
+def _write_file(context, name, chunks):
+    # Write under a temporary name so a failed or cancelled run leaves no partial download
+    path = context.path(name)
+    try:
+        with open(path + '.part', 'w', encoding='utf-8', newline='') as out:
+            for chunk in chunks:
+                out.write(chunk)
+    except BaseException:
+        if os.path.exists(path + '.part'):
+            os.remove(path + '.part')
+        raise
+    os.replace(path + '.part', path)
+
+
+def _export(context, name, fmt, fields, rows):
+    from app import exporter
+    count = 0
+
+    def counted():
+        nonlocal count
+        for count, row in enumerate(rows, start=1):
+            if count % exporter.BATCH_SIZE == 0:
+                context.progress(count)
+            yield row
+
+    filename = f'job-{context.job_id}-{exporter.filename(name, fmt)}'
+    with replica_reads():
+        _write_file(context, filename, exporter.iter_export(fmt, fields, counted()))
+    context.progress(count, force=True)
+    return {'file': filename, 'rows': count}
+
+
+@handler('export_orders')
+def _export_orders(context, fmt='csv', filters=None):
+    from werkzeug.datastructures import MultiDict
+    from app import exporter
+    from app.queries import order_filters_from_args
+    rows = exporter.order_rows(order_filters_from_args(MultiDict(filters or {})))
+    return _export(context, 'orders', fmt, exporter.ORDER_FIELDS, rows)
+
+
+@handler('export_customers')
+def _export_customers(context, fmt='csv', search=None, seller_id=None):
+    from app import exporter
+    rows = exporter.customer_rows(search=search, seller_id=seller_id)
+    return _export(context, 'customers', fmt, exporter.CUSTOMER_FIELDS, rows)
+
+
+# A second attempt would reject every row the first one inserted as a duplicate
+@handler('import_customers', retry=False)
+def _import_customers(context, upload, seller_id=None):
+    from app.importer import import_customers
+    with open(context.path(upload), encoding='utf-8-sig', newline='') as lines:
+        report = import_customers(lines, default_seller_id=seller_id,
+                                  progress=lambda report: context.progress(report.inserted + report.rejected))
+    context.progress(report.inserted + report.rejected, force=True)
+    return report.to_dict()
+
+
+@handler('renew_orders')
+def _renew_orders(context, window_start, window_end, seller_id=None, dry_run=False):
+    # Renewal runs skip what an earlier attempt renewed, so retrying is safe
+    from app.renewals import renew_orders
+    start = datetime.combine(date.fromisoformat(window_start), datetime.min.time())
+    end = datetime.combine(date.fromisoformat(window_end), datetime.min.time())
+    report = renew_orders(start, end, seller_id=seller_id, dry_run=dry_run,
+                          progress=lambda report: context.progress(report.candidates))
+    return {
+        'dry_run': report.dry_run,
+        'candidates': report.candidates,
+        'renewed': report.renewed,
+        'skipped': report.skipped,
+        'by_plan': {str(plan_id): count for plan_id, count in report.by_plan.most_common()},
+        'revenue': report.revenue,
+        'orders_per_second': report.rate,
+    }
+
+
+@handler('report_orders')
+def _report_orders(context, seller_id=None, plan_id=None, months=12):
+    from app.reports import build_report
+    context.progress(0, message='Loading orders', force=True)
+    with replica_reads():
+        report = build_report(seller_id, plan_id, months)
+    filename = f'job-{context.job_id}-report.json'
+    _write_file(context, filename, [json.dumps(report, indent=2, default=str)])
+    return {'file': filename, 'orders': report['orders']}
@@ -1,15 +1,22 @@
 from datetime import datetime, timedelta
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 from app import db, login_manager
+from app.passwords import hash_password, verify_password
+
+# Largest id an Integer primary key can hold; anything bigger overflows the driver
+MAX_ID = 2 ** 63 - 1
 
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
+    __table_args__ = (
+        # Seller listings filter on role and sort by username
+        db.Index('ix_users_role_username', 'role', 'username'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(128))
+    password_hash = db.Column(db.String(255))
     role = db.Column(db.String(20), nullable=False, default='seller')  # 'admin' or 'seller'
     
     # Relationships
@@ -17,10 +24,14 @@ class User(UserMixin, db.Model):
     orders_created = db.relationship('Order', backref='creator', lazy=True)
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        matches, new_hash = verify_password(self.password_hash, password)
+        if new_hash:
+            # Hashed with older parameters; the caller commits the upgrade
+            self.password_hash = new_hash
+        return matches
     
     def is_admin(self):
         return self.role == 'admin'
@@ -30,12 +41,20 @@ class User(UserMixin, db.Model):
 
 class Customer(db.Model):
     __tablename__ = 'customers'
+    __table_args__ = (
+        # Per-seller customer lists and counts
+        db.Index('ix_customers_seller_id_id', 'seller_id', 'id'),
+        # Case-insensitive email lookups (bulk import duplicate check)
+        db.Index('ix_customers_email_lower', db.text('lower(email)')),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     phone = db.Column(db.String(20))
     address = db.Column(db.Text)
+    # Bumped on every ORM update; the listings' ETags are built from it
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     # Foreign Keys
     seller_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -63,21 +82,43 @@ class SubscriptionPlan(db.Model):
 
 class Order(db.Model):
     __tablename__ = 'orders'
+    __table_args__ = (
+        # Lets the expiry job find overdue Active orders without a table scan
+        db.Index('ix_orders_status_end_date', 'status', 'end_date'),
+        # Newest-first listings and their (created_at, id) keyset cursor
+        db.Index('ix_orders_created_at_id', 'created_at', 'id'),
+        # A customer's order history and the per-customer order counts
+        db.Index('ix_orders_customer_id_created_at', 'customer_id', 'created_at'),
+        # Orders entered by a given seller
+        db.Index('ix_orders_created_by_created_at', 'created_by', 'created_at'),
+        # Orders not yet renewed, by end date, for the renewal run's window
+        db.Index('ix_orders_renewed_at_end_date', 'renewed_at', 'end_date', 'id'),
+        # At most one successor per order, so a renewal run can be repeated
+        db.Index('ix_orders_renewed_from_id', 'renewed_from_id', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     start_date = db.Column(db.DateTime, default=datetime.utcnow)
     end_date = db.Column(db.DateTime)
     status = db.Column(db.String(20), default='Active')  # 'Active', 'Expired', 'Pending'
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Core UPDATEs (the expiry job) must set it themselves
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    # When a successor order was created for this one; see app/renewals.py
+    renewed_at = db.Column(db.DateTime)
     
     # Foreign Keys
     customer_id = db.Column(db.Integer, db.ForeignKey('customers.id'), nullable=False)
     plan_id = db.Column(db.Integer, db.ForeignKey('subscription_plans.id'), nullable=False)
     created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    renewed_from_id = db.Column(db.Integer, db.ForeignKey('orders.id'))  # the order this one renews
     
     def calculate_end_date(self):
-        if self.start_date and self.plan:
-            self.end_date = self.start_date + timedelta(days=self.plan.duration_days)
+        # Plans come from the in-memory catalog, not the `plan` relationship
+        from app.catalog import get_plan
+        plan = get_plan(self.plan_id) if self.plan_id else None
+        if self.start_date and plan:
+            self.end_date = self.start_date + timedelta(days=plan.duration_days)
     
     def update_status(self):
         if self.end_date and datetime.utcnow() > self.end_date:
@@ -86,6 +127,70 @@ class Order(db.Model):
     def __repr__(self):
         return f'<Order {self.id} - {self.status}>'
 
+class Counter(db.Model):
+    __tablename__ = 'counters'
+    
+    # Keys look like 'orders' or 'seller:<id>:customers', see app/counters.py
+    key = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<Counter {self.key}={self.value}>'
+
+class DailyRollup(db.Model):
+    __tablename__ = 'daily_rollups'
+    __table_args__ = (
+        # One seller's trend on the seller dashboard
+        db.Index('ix_daily_rollups_seller_id_day', 'seller_id', 'day'),
+    )
+    
+    # One row per day, seller and plan, derived from orders; see app/rollups.py
+    day = db.Column(db.Date, primary_key=True)
+    seller_id = db.Column(db.Integer, primary_key=True)
+    plan_id = db.Column(db.Integer, primary_key=True)
+    new_orders = db.Column(db.Integer, nullable=False, default=0)
+    billed_orders = db.Column(db.Integer, nullable=False, default=0)  # new orders not Pending
+    started = db.Column(db.Integer, nullable=False, default=0)  # subscriptions starting that day
+    ended = db.Column(db.Integer, nullable=False, default=0)  # subscriptions that expired that day
+    
+    def __repr__(self):
+        return f'<DailyRollup {self.day} seller={self.seller_id} plan={self.plan_id}>'
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        # Workers claim the oldest due job in a status
+        db.Index('ix_jobs_status_run_at_id', 'status', 'run_at', 'id'),
+    )
+    
+    # A unit of background work and its progress; see app/jobs.py
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(32), nullable=False)
+    params = db.Column(db.JSON, nullable=False, default=dict)
+    status = db.Column(db.String(16), nullable=False, default='queued')  # queued, running, succeeded, failed, cancelled
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer)  # None when the size of the work is not known up front
+    message = db.Column(db.String(255))
+    result = db.Column(db.JSON)
+    error = db.Column(db.Text)  # the last failure, kept across retries
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+    worker = db.Column(db.String(64))
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # not claimed before this (retry backoff)
+    started_at = db.Column(db.DateTime)  # of the latest attempt
+    finished_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)
+    
+    # Foreign Keys
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    
+    def __repr__(self):
+        return f'<Job {self.id} {self.kind} - {self.status}>'
+
 @login_manager.user_loader
 def load_user(id):
-    return User.query.get(int(id))
+    # Served from the identity cache; see app/identity.py
+    from app.identity import load_identity
+    return load_identity(int(id))
@@ -0,0 +1,117 @@
+"""Batched order creation for the JSON API.
+
+A batch is validated with one query for the seller's customers and the
+in-memory plan catalog, end dates are computed from the plan durations in the
+same pass, and every valid order is inserted with a single executemany in
+one transaction, with its counter and rollup deltas and cache invalidation.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import insert, select
+from app import db, counters, cache, rollups
+from app.catalog import all_plans
+from app.models import Customer, Order, MAX_ID
+
+STATUSES = ('Active', 'Pending')
+
+
+def _parse_start(value, now):
+    if value is None:
+        return now
+    if not isinstance(value, str):
+        raise ValueError('start_date must be an ISO date or datetime string')
+    # A plain date starts at midnight, as in the order form
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        raise ValueError('start_date must be in UTC without an offset')
+    return parsed
+
+
+def _read_item(item, now):
+    """(customer_id, plan_id, start_date, status) from one request item"""
+    if not isinstance(item, dict):
+        raise ValueError('Each order must be an object')
+    customer_id, plan_id = item.get('customer_id'), item.get('plan_id')
+    # JSON true/false arrive as bool, which is an int subclass
+    if any(not isinstance(value, int) or isinstance(value, bool) for value in (customer_id, plan_id)):
+        raise ValueError('customer_id and plan_id must be integers')
+    if not all(0 < value <= MAX_ID for value in (customer_id, plan_id)):
+        raise ValueError('customer_id and plan_id must be positive 64-bit integers')
+    status = item.get('status', 'Active')
+    if status not in STATUSES:
+        raise ValueError(f'status must be one of {", ".join(STATUSES)}')
+    return customer_id, plan_id, _parse_start(item.get('start_date'), now), status
+
+
+def create_orders(seller_id, items, all_or_nothing=False):
+    """Create the orders in `items` for a seller and return (results, created).
+
+    `results` has one dict per item, in request order, with a `status` of
+    'created' (plus the new id and dates) or 'error' (plus the reason). With
+    `all_or_nothing`, any error leaves the other items 'skipped'.
+    """
+    now = datetime.utcnow()
+    results, parsed = [], []
+    for index, item in enumerate(items):
+        try:
+            parsed.append((index, _read_item(item, now)))
+            results.append(None)
+        except ValueError as e:
+            results.append({'index': index, 'status': 'error', 'error': str(e)})
+
+    customer_ids = {customer_id for _, (customer_id, _, _, _) in parsed}
+    # Only the seller's own customers count as found
+    owned = set(db.session.execute(
+        select(Customer.id).where(Customer.id.in_(customer_ids), Customer.seller_id == seller_id)
+    ).scalars()) if customer_ids else set()
+    plans = {plan.id: plan for plan in all_plans()}
+
+    rows, row_indexes = [], []
+    for index, (customer_id, plan_id, start_date, status) in parsed:
+        if customer_id not in owned:
+            results[index] = {'index': index, 'status': 'error', 'error': f'Unknown customer {customer_id}'}
+        elif plan_id not in plans:
+            results[index] = {'index': index, 'status': 'error', 'error': f'Unknown plan {plan_id}'}
+        else:
+            try:
+                end_date = start_date + timedelta(days=plans[plan_id].duration_days)
+            except OverflowError:
+                results[index] = {'index': index, 'status': 'error', 'error': 'start_date is too far in the future'}
+                continue
+            rows.append({
+                'customer_id': customer_id,
+                'plan_id': plan_id,
+                'start_date': start_date,
+                'end_date': end_date,
+                'status': status,
+                'created_by': seller_id,
+                'created_at': now,
+                'updated_at': now,
+            })
+            row_indexes.append(index)
+
+    if all_or_nothing and len(rows) < len(results):
+        for index in row_indexes:
+            results[index] = {'index': index, 'status': 'skipped', 'error': 'Another order in the batch was rejected'}
+        return results, 0
+    if not rows:
+        return results, 0
+
+    # executemany bypasses the flush events, so bump the counters and rollups here
+    ids = db.session.scalars(insert(Order).returning(Order.id, sort_by_parameter_order=True), rows).all()
+    counters.apply_deltas(db.session.connection(), {
+        counters.ORDERS: len(rows),
+        counters.seller_key(seller_id, counters.ORDERS): len(rows),
+    })
+    deltas = rollups.new_deltas()
+    for row in rows:
+        rollups.add_order(deltas, seller_id, row['plan_id'], row['status'], row['created_at'],
+                          row['start_date'], row['end_date'])
+    rollups.apply_deltas(db.session.connection(), deltas)
+    cache.changed(db.session, {seller_id})
+    db.session.commit()
+
+    for index, order_id, row in zip(row_indexes, ids, rows):
+        results[index] = {'index': index, 'status': 'created', 'id': order_id,
+                          'start_date': row['start_date'].isoformat(),
+                          'end_date': row['end_date'].isoformat()}
+    return results, len(rows)
@@ -0,0 +1,122 @@
+"""Password hashing service.
+
+All password hashes go through here. The algorithm and work factor come from
+PASSWORD_HASH_METHOD, a werkzeug method string such as "pbkdf2:sha256:600000"
+or "scrypt:32768:8:1". A hash made with other parameters still verifies,
+and `verify` also returns a replacement hash so the caller can upgrade the
+stored one on login.
+
+Hashing runs on a small thread pool (hashlib's scrypt/pbkdf2 and bcrypt
+release the GIL while they work). At most PASSWORD_HASH_WORKERS hashes run
+at once and at most PASSWORD_HASH_QUEUE more may wait. Beyond that,
+PasswordServiceBusy is raised straight away, so a burst of logins cannot take
+every CPU (or every request thread) away from the rest of the application.
+There is one pool per process; reconfiguring it for another app instance
+reuses it, or shuts it down if the size changed.
+
+Hashes in bcrypt format ($2a$/$2b$/$2y$), written by older versions, are
+verified with the `bcrypt` package if it is installed.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+
+DEFAULT_METHOD = 'pbkdf2:sha256:600000'  # werkzeug's default, what existing hashes use
+DEFAULT_WORKERS = 2
+DEFAULT_QUEUE = 16
+
+BCRYPT_PREFIXES = ('$2a$', '$2b$', '$2y$')
+
+
+class PasswordServiceBusy(Exception):
+    """Raised when too many hashes are already running or waiting"""
+
+
+class PasswordService:
+    def __init__(self, method=DEFAULT_METHOD, workers=DEFAULT_WORKERS, queue=DEFAULT_QUEUE):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._size = None
+        self.configure(method, workers, queue)
+
+    def configure(self, method=DEFAULT_METHOD, workers=DEFAULT_WORKERS, queue=DEFAULT_QUEUE):
+        self.method = method
+        with self._lock:
+            if self._size == (workers, queue):
+                return
+            # Hashes already running finish on the old pool; it exits after them
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+            self._size = (workers, queue)
+            self._workers = workers
+            self._slots = threading.BoundedSemaphore(workers + queue)
+            self._executor = None
+
+    def _run(self, fn, *args):
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            raise PasswordServiceBusy('Too many password checks in progress')
+        try:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self._workers, thread_name_prefix='passwords')
+                executor = self._executor
+            return executor.submit(fn, *args).result()
+        finally:
+            slots.release()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def needs_rehash(self, password_hash):
+        # werkzeug hashes are "<method>$<salt>$<hash>"
+        return password_hash.split('$', 1)[0] != self.method
+
+    def verify(self, password_hash, password):
+        """Return (matches, new_hash).
+
+        new_hash is a hash of `password` with the current parameters when the
+        password matched but `password_hash` was made with other ones, and
+        None otherwise.
+        """
+        if not password_hash or password is None:
+            return False, None
+        matches = self._run(_check, password_hash, password)
+        if matches and self.needs_rehash(password_hash):
+            return True, self.hash(password)
+        return matches, None
+
+
+def _check(password_hash, password):
+    if password_hash.startswith(BCRYPT_PREFIXES):
+        try:
+            import bcrypt
+        except ImportError:
+            return False
+        return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+    return check_password_hash(password_hash, password)
+
+
+service = PasswordService()
+
+
+def hash_password(password):
+    return service.hash(password)
+
+
+def verify_password(password_hash, password):
+    return service.verify(password_hash, password)
+
+
+def _busy(error):
+    return 'The server is busy, please try again in a moment.', 503, {'Retry-After': '1'}
+
+
+def init_app(app):
+    app.register_error_handler(PasswordServiceBusy, _busy)
+    service.configure(
+        method=app.config.get('PASSWORD_HASH_METHOD', DEFAULT_METHOD),
+        workers=app.config.get('PASSWORD_HASH_WORKERS', DEFAULT_WORKERS),
+        queue=app.config.get('PASSWORD_HASH_QUEUE', DEFAULT_QUEUE),
+    )
@@ -0,0 +1,258 @@
+import base64
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import and_, func, or_
+from app import db, counters
+from app.models import User, Customer, Order
+from app.search import match_subquery
+
+ORDER_STATUSES = ('Active', 'Expired', 'Pending')
+
+
+def parse_date(value):
+    # Used as a `type=` callable for request.args.get, so bad input is ignored
+    return datetime.strptime(value, '%Y-%m-%d')
+
+
+def order_filters_from_args(args):
+    """Read the status/seller/date filters shared by the order listings"""
+    status = args.get('status')
+    return {
+        'status': status if status in ORDER_STATUSES else None,
+        'seller_id': args.get('seller', type=int),
+        'start_date': args.get('start_date', type=parse_date),
+        'end_date': args.get('end_date', type=parse_date),
+    }
+
+
+def apply_order_filters(query, status=None, seller_id=None, start_date=None, end_date=None):
+    # The query must already be joined to Customer
+    if status:
+        query = query.filter(Order.status == status)
+    if seller_id:
+        query = query.filter(Customer.seller_id == seller_id)
+    if start_date:
+        query = query.filter(Order.start_date >= start_date)
+    if end_date:
+        # The "To Date" input is inclusive of the whole day
+        query = query.filter(Order.start_date < end_date + timedelta(days=1))
+    return query
+
+
+def encode_cursor(created_at, order_id):
+    raw = f'{created_at.isoformat()}|{order_id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    # Returns (created_at, id), or None for a missing/tampered cursor
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, order_id = base64.urlsafe_b64decode(padded).decode().split('|')
+        return datetime.fromisoformat(created_at), int(order_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def keyset_query(query, cursor=None, limit=25):
+    # Newest-first slice of `query` starting just after the cursor position
+    position = decode_cursor(cursor)
+    if position:
+        created_at, order_id = position
+        query = query.filter(or_(
+            Order.created_at < created_at,
+            and_(Order.created_at == created_at, Order.id < order_id)
+        ))
+    return query.order_by(Order.created_at.desc(), Order.id.desc()).limit(limit)
+
+
+def keyset_page(query, cursor=None, per_page=25):
+    """Return one page of orders newest-first plus the cursor for the next page.
+
+    Pages are addressed by the (created_at, id) of the last row seen rather
+    than an OFFSET, so every page costs the same regardless of depth.
+    """
+    rows = keyset_query(query, cursor, limit=per_page + 1).all()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    return rows, next_cursor
+
+
+# Listings select plain columns, not entities: rows come back as Row named
+# tuples that the session never tracks, and templates read them as attributes.
+# Plans are not joined; pages look plan_id up in app/catalog.py
+ORDER_COLUMNS = (Order.id, Order.plan_id, Order.status, Order.start_date, Order.end_date, Order.created_at)
+
+
+def admin_order_listing(filters=None):
+    query = db.session.query(
+        *ORDER_COLUMNS,
+        Customer.name.label('customer_name'),
+        User.username.label('seller_username')
+    )
+    query = query.join(Customer, Order.customer_id == Customer.id)
+    query = query.join(User, Customer.seller_id == User.id)
+    return apply_order_filters(query, **(filters or {}))
+
+
+def seller_order_listing(seller_id):
+    # Everything the order modal shows, so no row lazy-loads its customer
+    query = db.session.query(
+        *ORDER_COLUMNS,
+        Order.customer_id,
+        Customer.name.label('customer_name'),
+        Customer.email.label('customer_email'),
+        Customer.phone.label('customer_phone'),
+        Customer.address.label('customer_address')
+    ).join(
+        Customer, Order.customer_id == Customer.id
+    )
+    return query.filter(Customer.seller_id == seller_id)
+
+
+def sellers_version():
+    """(seller count, newest user id), for pages that show seller names.
+
+    Sellers are only ever added or removed (there is no page to rename one),
+    which the materialized counter and the primary key index catch.
+    """
+    count = counters.get_counts([counters.SELLERS])[counters.SELLERS]
+    return count, db.session.query(func.max(User.id)).scalar()
+
+
+def order_listing_version(filters):
+    """(last change, (row count, sellers version)) of the orders in a listing's filter scope.
+
+    Customer names show in every order listing, so the newest customer
+    change anywhere counts too; that is one lookup on its index. Seller
+    names and the seller filter come from the users table.
+    """
+    scoped = {key: value for key, value in filters.items() if value}
+    if scoped.keys() <= {'seller_id'}:
+        # All orders, or one seller's: the size comes from the materialized
+        # counters and MAX(updated_at) stays a single index lookup
+        seller_id = scoped.get('seller_id')
+        key = counters.seller_key(seller_id, counters.ORDERS) if seller_id else counters.ORDERS
+        count = counters.get_counts([key])[key]
+        query = db.session.query(func.max(Order.updated_at))
+        if seller_id:
+            query = query.join(Customer, Order.customer_id == Customer.id)
+        last_order = apply_order_filters(query, **scoped).scalar()
+    else:
+        query = db.session.query(func.max(Order.updated_at), func.count(Order.id))
+        if scoped.get('seller_id'):
+            query = query.join(Customer, Order.customer_id == Customer.id)
+        last_order, count = apply_order_filters(query, **scoped).one()
+    last_customer = db.session.query(func.max(Customer.updated_at)).scalar()
+    return max(filter(None, (last_order, last_customer)), default=None), (count, sellers_version())
+
+
+def status_counts_query(filters):
+    # The status filter itself is left out so the summary cards keep showing
+    # the full breakdown for the selected seller/date range
+    scoped = dict(filters, status=None)
+    query = db.session.query(Order.status, func.count(Order.id))
+    query = query.join(Customer, Order.customer_id == Customer.id)
+    return apply_order_filters(query, **scoped).group_by(Order.status)
+
+
+def order_status_counts(filters):
+    """Count orders per status in a single grouped query"""
+    counts = {status: 0 for status in ORDER_STATUSES}
+    for status, count in status_counts_query(filters):
+        counts[status] = count
+    return counts
+
+
+def apply_customer_filters(query, search=None, seller_id=None):
+    # Searches go through the full-text index, best matches first
+    if search:
+        hits = match_subquery(search)
+        if hits is not None:
+            query = query.join(hits, hits.c.customer_id == Customer.id).order_by(hits.c.rank)
+        else:
+            pattern = f'%{search}%'
+            query = query.filter(or_(Customer.name.ilike(pattern), Customer.email.ilike(pattern)))
+    if seller_id:
+        query = query.filter(Customer.seller_id == seller_id)
+    return query
+
+
+def customer_listing_version(search=None, seller_id=None):
+    """(last change, (row count, order count, sellers version)) of the customers a listing shows.
+
+    The order counts in the listing change with any order insert or delete,
+    which the newest order change and the materialized order counter catch.
+    """
+    if seller_id:
+        customers_key = counters.seller_key(seller_id, counters.CUSTOMERS)
+        orders_key = counters.seller_key(seller_id, counters.ORDERS)
+    else:
+        customers_key, orders_key = counters.CUSTOMERS, counters.ORDERS
+    sizes = counters.get_counts([customers_key, orders_key])
+
+    if search:
+        query = db.session.query(func.max(Customer.updated_at), func.count(Customer.id))
+        last_customer, count = apply_customer_filters(query, search, seller_id).order_by(None).one()
+    else:
+        query = db.session.query(func.max(Customer.updated_at))
+        last_customer = apply_customer_filters(query, seller_id=seller_id).scalar()
+        count = sizes[customers_key]
+    last_order = db.session.query(func.max(Order.updated_at)).scalar()
+    return max(filter(None, (last_customer, last_order)), default=None), (count, sizes[orders_key],
+                                                                           sellers_version())
+
+
+def customer_listing(search=None, seller_id=None):
+    """Customers with their seller and order count, ready to paginate.
+
+    Order counts come from a correlated subquery, so only the customers on
+    the requested page are counted (one range read each on
+    ix_orders_customer_id_created_at), and rendering a page never touches
+    the Customer.orders relationship.
+    """
+    order_count = db.session.query(func.count(Order.id)).filter(
+        Order.customer_id == Customer.id
+    ).correlate(Customer).scalar_subquery()
+
+    query = db.session.query(
+        Customer.id,
+        Customer.name,
+        Customer.email,
+        Customer.phone,
+        User.username.label('seller_username'),
+        order_count.label('order_count')
+    )
+    query = query.join(User, Customer.seller_id == User.id)
+
+    return apply_customer_filters(query, search, seller_id).order_by(Customer.id)
+
+
+def seller_customer_listing(seller_id, search=None):
+    """The seller's customers plus their orders grouped by customer id.
+
+    Orders for every listed customer come from one query instead of a lazy
+    load of Customer.orders per row.
+    """
+    customers = apply_customer_filters(
+        db.session.query(Customer.id, Customer.name, Customer.email, Customer.phone),
+        search, seller_id
+    ).order_by(Customer.id).all()
+
+    orders = db.session.query(Order.customer_id, *ORDER_COLUMNS).join(
+        Customer, Order.customer_id == Customer.id
+    ).filter(Customer.seller_id == seller_id)
+    if search:
+        matched = apply_customer_filters(db.session.query(Customer.id), search, seller_id)
+        orders = orders.filter(Order.customer_id.in_(matched.order_by(None).scalar_subquery()))
+
+    orders_by_customer = defaultdict(list)
+    for order in orders.order_by(Order.customer_id, Order.created_at.desc()):
+        orders_by_customer[order.customer_id].append(order)
+    return customers, orders_by_customer
@@ -0,0 +1,148 @@
+"""Bulk subscription renewals.
+
+`renew_orders` gives every Active or Expired order whose end_date falls in a
+window a successor order for the same customer and plan, starting where the
+old one ends (or now, for one that has already lapsed). Candidates are read
+in (end_date, id) order from the `ix_orders_renewed_at_end_date` index,
+chunk by chunk. Each chunk is one transaction: the predecessors are claimed
+with an UPDATE that sets `renewed_at`, then the successors for the claimed
+rows are inserted with one executemany, together with their counter and
+rollup deltas.
+
+Only orders without `renewed_at` are picked up, and the unique index on
+`renewed_from_id` allows one successor per order, so re-running a window
+(or two runs overlapping) never renews an order twice.
+"""
+import time
+from collections import Counter as Tally
+from datetime import datetime, timedelta
+from sqlalchemy import and_, func, or_, select
+from app import db, counters, cache, rollups
+from app.catalog import get_plan
+from app.models import Customer, Order
+
+DEFAULT_CHUNK_SIZE = 1000
+RENEWABLE = ('Active', 'Expired')
+
+
+class RenewalReport:
+    def __init__(self, dry_run):
+        self.dry_run = dry_run
+        self.candidates = 0
+        self.renewed = 0
+        self.skipped = 0  # renewed by someone else meanwhile, or no plan
+        self.by_plan = Tally()  # plan_id -> orders renewed (or to renew)
+        self.revenue = 0.0
+        self.elapsed = 0.0
+
+    @property
+    def rate(self):
+        """Orders renewed (or examined, for a dry run) per second"""
+        done = self.candidates if self.dry_run else self.renewed
+        return done / self.elapsed if self.elapsed else 0.0
+
+
+def _candidates(window_start, window_end, seller_id, last_id, after, chunk_size):
+    orders, customers = Order.__table__, Customer.__table__
+    query = select(
+        orders.c.id, orders.c.customer_id, orders.c.plan_id, orders.c.created_by, orders.c.end_date,
+        customers.c.seller_id
+    ).join_from(orders, customers, orders.c.customer_id == customers.c.id).where(
+        orders.c.renewed_at.is_(None),
+        orders.c.end_date >= window_start, orders.c.end_date < window_end,
+        orders.c.status.in_(RENEWABLE), orders.c.id <= last_id
+    )
+    if seller_id:
+        query = query.where(customers.c.seller_id == seller_id)
+    if after:
+        end_date, order_id = after
+        query = query.where(or_(orders.c.end_date > end_date,
+                                and_(orders.c.end_date == end_date, orders.c.id > order_id)))
+    return db.session.execute(query.order_by(orders.c.end_date, orders.c.id).limit(chunk_size)).all()
+
+
+def _renew_chunk(rows, now, report):
+    orders = Order.__table__
+    # Claim the predecessors first; rows another run got to are not returned
+    claimed = set(db.session.execute(
+        orders.update().where(orders.c.id.in_([row.id for row in rows]), orders.c.renewed_at.is_(None))
+        .values(renewed_at=now, updated_at=now).returning(orders.c.id)
+    ).scalars())
+
+    successors, deltas, sellers = [], rollups.new_deltas(), Tally()
+    for row in rows:
+        plan = get_plan(row.plan_id)
+        if row.id not in claimed or plan is None:
+            report.skipped += 1
+            continue
+        start_date = max(row.end_date, now)
+        successor = {
+            'customer_id': row.customer_id,
+            'plan_id': row.plan_id,
+            'created_by': row.created_by,
+            'start_date': start_date,
+            'end_date': start_date + timedelta(days=plan.duration_days),
+            'status': 'Active',
+            'created_at': now,
+            'updated_at': now,
+            'renewed_from_id': row.id,
+        }
+        successors.append(successor)
+        rollups.add_order(deltas, row.seller_id, row.plan_id, 'Active', now,
+                          successor['start_date'], successor['end_date'])
+        sellers[row.seller_id] += 1
+        report.by_plan[row.plan_id] += 1
+        report.revenue += plan.price
+
+    if successors:
+        # executemany bypasses the flush events, so bump the counters and rollups here
+        connection = db.session.connection()
+        connection.execute(orders.insert(), successors)
+        counter_deltas = {counters.seller_key(seller_id, counters.ORDERS): count
+                          for seller_id, count in sellers.items()}
+        counter_deltas[counters.ORDERS] = len(successors)
+        counters.apply_deltas(connection, counter_deltas)
+        rollups.apply_deltas(connection, deltas)
+        cache.changed(db.session, set(sellers))
+    db.session.commit()
+    report.renewed += len(successors)
+
+
+def renew_orders(window_start, window_end, seller_id=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                 dry_run=False, now=None, progress=None):
+    """Renew the orders ending in [window_start, window_end) and return a RenewalReport.
+
+    With `dry_run` nothing is written; the report says what would be
+    renewed. `progress`, if given, is called with the report after each
+    chunk.
+    """
+    now = now or datetime.utcnow()
+    report = RenewalReport(dry_run)
+    start = time.perf_counter()
+    # Successors created by this run can end inside a long window; leave them for the next
+    last_id = db.session.query(func.max(Order.id)).scalar() or 0
+    after = None
+    while True:
+        rows = _candidates(window_start, window_end, seller_id, last_id, after, chunk_size)
+        if not rows:
+            break
+        report.candidates += len(rows)
+        if dry_run:
+            for row in rows:
+                plan = get_plan(row.plan_id)
+                if plan is None:
+                    report.skipped += 1
+                    continue
+                report.by_plan[row.plan_id] += 1
+                report.revenue += plan.price
+            db.session.rollback()
+        else:
+            _renew_chunk(rows, now, report)
+        report.elapsed = time.perf_counter() - start
+        if progress:
+            progress(report)
+        if len(rows) < chunk_size:
+            break
+        after = (rows[-1].end_date, rows[-1].id)
+    report.elapsed = time.perf_counter() - start
+    return report
@@ -0,0 +1,114 @@
+"""Read-replica routing.
+
+With DATABASE_REPLICA_URL set, the replica becomes the `replica` bind and
+`db.session` (a RoutingSession) sends the SELECTs of read-only work there.
+Everything else stays on the primary: flushes, Core INSERT/UPDATE/DELETE,
+text() statements and `session.connection()` calls that name no statement.
+
+`init_app` marks GET and HEAD requests read-only, apart from:
+
+* requests from a browser that wrote within REPLICA_STICKY_SECONDS. Every
+  POST (or other unsafe method) sets a short-lived cookie, so the redirect
+  after a form and the pages after it read the primary and show what the
+  user just changed, however far the replica lags
+* the JSON API, whose token clients carry no cookie to make that work
+* views marked with @primary_reads, such as the job progress pages, which
+  must not lag behind the workers
+* the rest of a request once its session has written anything
+
+Code outside a request (CLI commands, job workers, the expiry thread) uses
+the primary unless it opts in with `replica_reads()`. Values stored in the
+shared cache (app/cache.py) are computed inside `primary_only()`: a lagging
+replica read stored under the generation a write has just bumped would be
+served to everyone, the writer included, until it expires. Without a replica
+configured none of this is installed and every query goes to the primary.
+"""
+import time
+from contextlib import contextmanager
+from flask import current_app, request
+from flask_sqlalchemy.session import Session
+
+REPLICA = 'replica'  # bind key
+READ_ONLY = 'replica_reads'  # session.info flag
+COOKIE = 'read_primary_until'
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Blueprints whose reads always go to the primary
+PRIMARY_BLUEPRINTS = ('api',)
+
+
+def _is_read(clause):
+    return clause is not None and getattr(clause, 'is_select', False)
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that reads from the replica while its info says so"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.info.get(READ_ONLY):
+            if not self._flushing and _is_read(clause):
+                replica = self._db.engines.get(REPLICA)
+                if replica is not None:
+                    return replica
+            else:
+                # A write: whatever this session reads next must see it
+                self.info[READ_ONLY] = False
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+
+def engine_binds(config):
+    """SQLALCHEMY_BINDS entry for the replica, with the engine profile for its kind of database"""
+    from app.engine import engine_options
+    url = config['DATABASE_REPLICA_URL']
+    return {REPLICA: dict(engine_options(config, url), url=url)} if url else {}
+
+
+def primary_reads(view):
+    """Mark a view whose reads must always see the primary"""
+    view.primary_reads = True
+    return view
+
+
+@contextmanager
+def _reads(replica):
+    from app import db
+    previous = db.session.info.get(READ_ONLY)
+    db.session.info[READ_ONLY] = replica
+    try:
+        yield
+    finally:
+        db.session.info[READ_ONLY] = previous
+
+
+def replica_reads():
+    """Send the session's SELECTs to the replica (if there is one) inside the block"""
+    return _reads(True)
+
+
+def primary_only():
+    """Keep the session's SELECTs on the primary inside the block"""
+    return _reads(False)
+
+
+def init_app(app):
+    if not app.config['DATABASE_REPLICA_URL']:
+        return
+    from app import db
+
+    def route_request():
+        primary_until = request.cookies.get(COOKIE, type=int)
+        view = current_app.view_functions.get(request.endpoint)
+        db.session.info[READ_ONLY] = (request.method in READ_METHODS
+                                      and request.blueprint not in PRIMARY_BLUEPRINTS
+                                      and not getattr(view, 'primary_reads', False)
+                                      and not (primary_until and primary_until > time.time()))
+
+    def stick_to_primary(response):
+        # Read-your-writes: this browser reads the primary for a while after writing
+        if request.method not in READ_METHODS:
+            seconds = current_app.config['REPLICA_STICKY_SECONDS']
+            response.set_cookie(COOKIE, str(int(time.time()) + seconds), max_age=seconds,
+                                httponly=True, samesite='Lax')
+        return response
+
+    app.before_request(route_request)
+    app.after_request(stick_to_primary)
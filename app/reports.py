@@ -0,0 +1,254 @@
+"""Ad-hoc order analytics over columnar snapshots.
+
+Cohort, retention and renewal questions need every order, which is far too
+slow to answer by looping over ORM objects. `load_orders` streams the few
+columns involved in chunks into NumPy arrays, and the functions below work
+on whole arrays at once: active-at-date counts by binary search over sorted
+start and end days, renewal gaps from one sort by customer, and cohort
+matrices from a single bincount.
+
+NumPy is only imported when a report runs, so it adds nothing to start-up.
+Results are cached per data version (the order count and the newest
+updated_at), so repeat views are free until orders change.
+"""
+from datetime import date, datetime
+from sqlalchemy import String, select, type_coerce
+from app import db
+from app.cache import cache
+from app.models import Order
+
+BILLED = ('Active', 'Expired')
+DEFAULT_CHUNK_SIZE = 50000
+DEFAULT_MONTHS = 12
+# Bucket edges, in days from one subscription's end to the next one's start
+RENEWAL_BUCKETS = (-30, 0, 7, 30, 90)
+EPOCH_MONTH = 1970 * 12
+NAMESPACE = 'reports'
+CACHE_TTL = 3600
+
+
+def _numpy():
+    import numpy
+    return numpy
+
+
+class OrderSnapshot:
+    """Order columns as parallel NumPy arrays, one element per order"""
+
+    def __init__(self, seller, customer, plan, start, end, billed):
+        self.seller = seller  # created_by, int32
+        self.customer = customer  # int32
+        self.plan = plan  # int32
+        self.start = start  # datetime64[D], NaT when missing
+        self.end = end  # datetime64[D], NaT when missing
+        self.billed = billed  # bool: Active or Expired
+
+    def __len__(self):
+        return len(self.customer)
+
+
+def load_orders(seller_id=None, plan_id=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Stream the orders (optionally one seller's or one plan's) into an OrderSnapshot"""
+    np = _numpy()
+    # Dates come back as the driver returns them (ISO strings on SQLite), for
+    # NumPy to parse in bulk instead of SQLAlchemy building datetimes per row
+    query = select(Order.created_by, Order.customer_id, Order.plan_id,
+                   type_coerce(Order.start_date, String), type_coerce(Order.end_date, String), Order.status)
+    if seller_id:
+        query = query.where(Order.created_by == seller_id)
+    if plan_id:
+        query = query.where(Order.plan_id == plan_id)
+
+    columns = ([], [], [], [], [], [])
+    # Core rather than the ORM session: plain tuples, streamed chunk by chunk. The
+    # query is passed along so a read-only request can take it to the replica
+    connection = db.session.connection(bind_arguments={'clause': query})
+    result = connection.execution_options(yield_per=chunk_size).execute(query)
+    for rows in result.partitions():
+        sellers, customers, plans, starts, ends, statuses = zip(*rows)
+        columns[0].append(np.array(sellers, dtype=np.int32))
+        columns[1].append(np.array(customers, dtype=np.int32))
+        columns[2].append(np.array(plans, dtype=np.int32))
+        columns[3].append(np.array(starts, dtype='datetime64[us]').astype('datetime64[D]'))
+        columns[4].append(np.array(ends, dtype='datetime64[us]').astype('datetime64[D]'))
+        columns[5].append(np.isin(np.array(statuses, dtype=object), BILLED))
+
+    empty = (np.int32, np.int32, np.int32, 'datetime64[D]', 'datetime64[D]', bool)
+    return OrderSnapshot(*(np.concatenate(chunks) if chunks else np.empty(0, dtype=dtype)
+                           for chunks, dtype in zip(columns, empty)))
+
+
+def _subscriptions(snapshot):
+    # Billed orders with a start date; a missing end never ends
+    np = _numpy()
+    mask = snapshot.billed & ~np.isnat(snapshot.start)
+    start = snapshot.start[mask].astype(np.int64)
+    end = snapshot.end[mask]
+    end = np.where(np.isnat(end), np.iinfo(np.int64).max, end.astype(np.int64))
+    return mask, start, end
+
+
+def active_counts(snapshot, dates, by=None):
+    """Billed subscriptions running on each of `dates`, per value of the `by` column.
+
+    Returns (groups, counts): the group values (a single None without `by`)
+    and a len(groups) x len(dates) array. A subscription runs from its start
+    day up to, not including, its end day.
+    """
+    np = _numpy()
+    mask, start, end = _subscriptions(snapshot)
+    days = np.asarray(dates, dtype='datetime64[D]').astype(np.int64)
+    if by is None:
+        groups, codes = np.array([None], dtype=object), np.zeros(len(start), dtype=np.int64)
+    else:
+        groups, codes = np.unique(getattr(snapshot, by)[mask], return_inverse=True)
+    if not len(days) or not len(start):
+        return list(groups), np.zeros((len(groups), len(days)), dtype=np.int64)
+
+    # Key every day as group * width + offset, so one sorted array per column
+    # answers "how many in this group on or before this day" for all groups
+    base = min(start.min(), days.min())
+    width = days.max() - base + 2
+    grid = np.arange(len(groups))[:, None] * width
+    query = grid + (days - base)[None, :]
+
+    def on_or_before(values):
+        keys = np.sort(codes * width + np.clip(values - base, 0, width - 1))
+        return np.searchsorted(keys, query, side='right') - np.searchsorted(keys, grid, side='left')
+
+    return list(groups), on_or_before(start) - on_or_before(end)
+
+
+def renewal_gaps(snapshot, today=None):
+    """Renewal behaviour from each customer's consecutive subscriptions.
+
+    Returns (gaps, ended, renewed): the days from every subscription's end
+    to the same customer's next start (negative when renewed early), how
+    many subscriptions have ended by `today`, and how many of those were
+    followed by another.
+    """
+    np = _numpy()
+    today = np.datetime64(today or datetime.utcnow().date(), 'D').astype(np.int64)
+    mask, start, end = _subscriptions(snapshot)
+    customer = snapshot.customer[mask]
+    order = np.lexsort((start, customer))
+    customer, start, end = customer[order], start[order], end[order]
+
+    # Pairs of one customer's subscriptions; an open-ended one has no gap
+    followed = (customer[1:] == customer[:-1]) & (end[:-1] != np.iinfo(np.int64).max)
+    gaps = start[1:][followed] - end[:-1][followed]
+    ended = end <= today
+    # Only subscriptions that have ended can have been renewed late
+    renewed_after_end = followed & ended[:-1]
+    return gaps, int(ended.sum()), int(renewed_after_end.sum())
+
+
+def renewal_summary(snapshot, today=None):
+    np = _numpy()
+    gaps, ended, renewed = renewal_gaps(snapshot, today)
+    edges = np.array(RENEWAL_BUCKETS)
+    counts = np.bincount(np.searchsorted(edges, gaps, side='right'), minlength=len(edges) + 1)
+    labels = ([f'< {edges[0]}'] + [f'{lo} to {hi - 1}' for lo, hi in zip(edges[:-1], edges[1:])]
+              + [f'>= {edges[-1]}'])
+    return {
+        'renewals': int(len(gaps)),
+        'ended': ended,
+        'renewal_rate': renewed / ended if ended else None,
+        'median_gap': float(np.median(gaps)) if len(gaps) else None,
+        'p25_gap': float(np.percentile(gaps, 25)) if len(gaps) else None,
+        'p75_gap': float(np.percentile(gaps, 75)) if len(gaps) else None,
+        'buckets': [{'label': label, 'count': int(count)} for label, count in zip(labels, counts)],
+    }
+
+
+def _month_index(value):
+    return value.year * 12 + value.month - 1
+
+
+def _month_date(index):
+    return date(int(index) // 12, int(index) % 12 + 1, 1)
+
+
+def cohort_matrix(snapshot, months=DEFAULT_MONTHS, today=None):
+    """Retention of customers by the month of their first subscription.
+
+    Covers cohorts starting in the last `months` months. `retention[k]` is
+    the share of the cohort with a subscription running at some point of
+    the k-th month after it started (0 being the start month), None for
+    months still to come.
+    """
+    np = _numpy()
+    # Months counted from 1970-01, as datetime64[M] does
+    current = _month_index(today or datetime.utcnow().date()) - EPOCH_MONTH
+    mask, _, _ = _subscriptions(snapshot)
+    start = snapshot.start[mask].astype('datetime64[M]').astype(np.int64)
+    end = snapshot.end[mask]
+    # An end on the 1st closes the month before; a missing end runs to now
+    end = np.where(np.isnat(end), current,
+                   (end - np.timedelta64(1, 'D')).astype('datetime64[M]').astype(np.int64))
+    end = np.maximum(end, start)
+    customers, customer_of = np.unique(snapshot.customer[mask], return_inverse=True)
+    first = np.full(len(customers), np.iinfo(np.int64).max)
+    np.minimum.at(first, customer_of, start)
+
+    # Every (customer, month offset) a subscription covers, each counted once
+    low = start - first[customer_of]
+    high = np.minimum(end - first[customer_of], months - 1)
+    lengths = np.clip(high - low + 1, 0, None)
+    rows = np.repeat(np.arange(len(low)), lengths)
+    steps = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    covered = np.unique(customer_of[rows] * months + low[rows] + steps)
+
+    cohorts, cohort_of = np.unique(first, return_inverse=True)
+    sizes = np.bincount(cohort_of, minlength=len(cohorts))
+    active = np.bincount(cohort_of[covered // months] * months + covered % months,
+                         minlength=len(cohorts) * months).reshape(len(cohorts), months)
+
+    result = []
+    for index, cohort in enumerate(cohorts):
+        if cohort < current - months + 1:
+            continue
+        result.append({
+            'month': _month_date(cohort + EPOCH_MONTH),
+            'customers': int(sizes[index]),
+            'retention': [float(active[index, k] / sizes[index]) if cohort + k <= current else None
+                          for k in range(months)],
+        })
+    return result
+
+
+def build_report(seller_id=None, plan_id=None, months=DEFAULT_MONTHS, today=None):
+    """Active subscriptions by plan, renewal behaviour and cohort retention as plain data"""
+    np = _numpy()
+    today = today or datetime.utcnow().date()
+    snapshot = load_orders(seller_id, plan_id)
+    month_starts = [_month_date(_month_index(today) - offset) for offset in range(months - 1, -1, -1)]
+    plans, counts = active_counts(snapshot, month_starts, by='plan')
+    return {
+        'orders': len(snapshot),
+        'subscriptions': int(np.count_nonzero(snapshot.billed)),
+        'months': month_starts,
+        'active_by_plan': [{'plan_id': int(plan), 'counts': [int(count) for count in row]}
+                           for plan, row in zip(plans, counts)],
+        'active_total': [int(count) for count in counts.sum(axis=0)] if len(plans) else [0] * months,
+        'renewals': renewal_summary(snapshot, today),
+        'cohorts': cohort_matrix(snapshot, months, today),
+    }
+
+
+def data_version():
+    """(newest change, order count and sellers); any order write moves one of them"""
+    from app.queries import order_listing_version
+    last_modified, token = order_listing_version({})
+    return last_modified and last_modified.isoformat(), token
+
+
+def cached_report(seller_id=None, plan_id=None, months=DEFAULT_MONTHS):
+    # Keyed by the data version rather than invalidated by writes: a busy
+    # hour of orders would otherwise throw away every report as it was built.
+    # The version comes from the same database as the report, so a replica
+    # may build it
+    return cache.get_or_set(NAMESPACE, 'reports.orders', lambda: build_report(seller_id, plan_id, months),
+                            params={'seller_id': seller_id, 'plan_id': plan_id, 'months': months,
+                                    'version': data_version()},
+                            ttl=CACHE_TTL, primary=False)
@@ -0,0 +1,269 @@
+"""Daily revenue and subscription rollups for the dashboard analytics.
+
+`daily_rollups` holds one row per day, seller and plan with four counts:
+orders created that day (`new_orders`, and `billed_orders` for those that
+are Active or Expired rather than Pending), subscriptions that started that
+day (by start_date) and subscriptions that expired that day (by end_date).
+Every count is also added to an all-sellers row (seller_id 0), so the admin
+trend reads a few rows per day, like a seller's. Revenue and MRR are those
+counts times the plan's current price from the plan catalog, worked out when
+a trend is read, so changing a price never leaves stale rows behind.
+
+Every order adds to the rows for its own dates, so an order write moves a
+few counts: the session's flush events handle ORM writes, and Core writers
+(the expiry job, the API batch) call `apply_deltas` themselves, as they do
+for app/counters.py. `flask rollups rebuild` recomputes the table from the
+orders.
+"""
+from collections import Counter as Tally, defaultdict
+from datetime import date
+from sqlalchemy import Date, event, func, inspect, or_, select
+from app import db
+from app.catalog import get_plan
+from app.counters import seller_ids_for_customers
+from app.models import User, Customer, Order, DailyRollup
+
+# seller_id of the rows summing every seller; user ids start at 1
+ALL_SELLERS = 0
+BILLED = ('Active', 'Expired')
+COLUMNS = ('new_orders', 'billed_orders', 'started', 'ended')
+# Order columns a rollup row depends on
+TRACKED = ('customer_id', 'plan_id', 'status', 'created_at', 'start_date', 'end_date')
+# MRR spreads each plan's price over 30-day months
+MONTH_DAYS = 30
+TREND_MONTHS = 12
+TOP_SELLERS = 10
+
+
+def new_deltas():
+    """{(day, seller_id, plan_id): Counter of column deltas}"""
+    return defaultdict(Tally)
+
+
+def add_order(deltas, seller_id, plan_id, status, created_at, start_date, end_date, sign=1):
+    """Add one order's counts to `deltas`, or take them away with sign=-1"""
+    def add(moment, column):
+        if moment is not None:
+            deltas[(moment.date(), seller_id, plan_id)][column] += sign
+            deltas[(moment.date(), ALL_SELLERS, plan_id)][column] += sign
+
+    add(created_at, 'new_orders')
+    if status in BILLED:
+        add(created_at, 'billed_orders')
+        add(start_date, 'started')
+    if status == 'Expired':
+        add(end_date, 'ended')
+
+
+def apply_deltas(connection, deltas):
+    # Increment in place; create the row the first time a key is seen
+    table = DailyRollup.__table__
+    for (day, seller_id, plan_id), counts in deltas.items():
+        counts = {column: delta for column, delta in counts.items() if delta}
+        if not counts:
+            continue
+        result = connection.execute(table.update().where(
+            table.c.day == day, table.c.seller_id == seller_id, table.c.plan_id == plan_id
+        ).values({column: table.c[column] + delta for column, delta in counts.items()}))
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(
+                day=day, seller_id=seller_id, plan_id=plan_id,
+                **{column: counts.get(column, 0) for column in COLUMNS}
+            ))
+
+
+def _order_states(connection, order_ids=(), customer_ids=()):
+    """Current (id, seller_id, plan_id, status, created_at, start_date, end_date) rows"""
+    if not order_ids and not customer_ids:
+        return []
+    orders, customers = Order.__table__, Customer.__table__
+    return connection.execute(select(
+        orders.c.id, customers.c.seller_id, orders.c.plan_id, orders.c.status,
+        orders.c.created_at, orders.c.start_date, orders.c.end_date
+    ).join_from(orders, customers, orders.c.customer_id == customers.c.id).where(or_(
+        orders.c.id.in_(order_ids), orders.c.customer_id.in_(customer_ids)
+    ))).all()
+
+
+def _before_flush(session, flush_context, instances):
+    # The orders this flush changes or deletes, and those of customers moving
+    # to another seller, lose their old counts; _after_flush adds the new ones
+    order_ids, customer_ids = set(), set()
+    for obj in session.dirty:
+        if isinstance(obj, Order):
+            state = inspect(obj)
+            if any(state.attrs[name].history.has_changes() for name in TRACKED):
+                order_ids.add(obj.id)
+        elif isinstance(obj, Customer) and inspect(obj).attrs.seller_id.history.has_changes():
+            customer_ids.add(obj.id)
+    deleted = {obj.id for obj in session.deleted if isinstance(obj, Order) and obj.id is not None}
+
+    deltas = new_deltas()
+    rows = _order_states(session.connection(), order_ids | deleted, customer_ids)
+    for _, *order in rows:
+        add_order(deltas, *order, sign=-1)
+    session.info['rollups'] = (deltas, {row.id for row in rows} - deleted)
+
+
+def _after_flush(session, flush_context):
+    deltas, order_ids = session.info.pop('rollups', (new_deltas(), set()))
+    order_ids |= {obj.id for obj in session.new if isinstance(obj, Order)}
+    for _, *order in _order_states(session.connection(), order_ids):
+        add_order(deltas, *order)
+    if deltas:
+        apply_deltas(session.connection(), deltas)
+
+
+def expired_deltas(connection, rows):
+    """Deltas for orders just moved from Active to Expired, given (customer_id, plan_id, end_date) rows"""
+    deltas = new_deltas()
+    sellers = seller_ids_for_customers(connection, {customer_id for customer_id, _, _ in rows})
+    for customer_id, plan_id, end_date in rows:
+        seller_id = sellers.get(customer_id)
+        if seller_id is not None and end_date is not None:
+            for key_seller_id in (seller_id, ALL_SELLERS):
+                deltas[(end_date.date(), key_seller_id, plan_id)]['ended'] += 1
+    return deltas
+
+
+def rebuild():
+    """Recompute every rollup row from the orders in one transaction; returns the row count"""
+    orders, customers = Order.__table__, Customer.__table__
+    billed = orders.c.status.in_(BILLED)
+    deltas = new_deltas()
+    for column, moment, condition in (('new_orders', orders.c.created_at, None),
+                                      ('billed_orders', orders.c.created_at, billed),
+                                      ('started', orders.c.start_date, billed),
+                                      ('ended', orders.c.end_date, orders.c.status == 'Expired')):
+        day = func.date(moment, type_=Date)
+        query = select(day, customers.c.seller_id, orders.c.plan_id, func.count()).join_from(
+            orders, customers, orders.c.customer_id == customers.c.id
+        ).where(moment.isnot(None)).group_by(day, customers.c.seller_id, orders.c.plan_id)
+        if condition is not None:
+            query = query.where(condition)
+        for day, seller_id, plan_id, count in db.session.execute(query):
+            deltas[(day, seller_id, plan_id)][column] = count
+            deltas[(day, ALL_SELLERS, plan_id)][column] += count
+
+    table = DailyRollup.__table__
+    connection = db.session.connection()
+    connection.execute(table.delete())
+    if deltas:
+        connection.execute(table.insert(), [
+            {'day': day, 'seller_id': seller_id, 'plan_id': plan_id,
+             **{column: counts[column] for column in COLUMNS}}
+            for (day, seller_id, plan_id), counts in deltas.items()
+        ])
+    db.session.commit()
+    return len(deltas)
+
+
+def _price(plan_id):
+    plan = get_plan(plan_id)
+    return plan.price if plan else 0
+
+
+def _monthly_price(plan_id):
+    plan = get_plan(plan_id)
+    return plan.price * MONTH_DAYS / plan.duration_days if plan and plan.duration_days else 0
+
+
+def _window(months, today):
+    # First day of the month `months - 1` months before today's
+    index = today.year * 12 + today.month - 1 - (months - 1)
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _scoped(query, seller_id):
+    return query.where(DailyRollup.seller_id == (ALL_SELLERS if seller_id is None else seller_id))
+
+
+def trend(seller_id=None, months=TREND_MONTHS, today=None):
+    """Month-by-month figures for the last `months` months, oldest first.
+
+    Each month is a dict with new_orders, revenue (billed orders times plan
+    price), expired, and active subscriptions and MRR at the end of the
+    month; churn is expired over active at the start of the month.
+    """
+    today = today or date.today()
+    start = _window(months, today)
+
+    # Subscriptions already running when the window opens, per plan
+    opening = db.session.execute(_scoped(select(
+        DailyRollup.plan_id, func.sum(DailyRollup.started - DailyRollup.ended)
+    ).where(DailyRollup.day < start).group_by(DailyRollup.plan_id), seller_id)).all()
+    active = sum(count for _, count in opening)
+    mrr = sum(count * _monthly_price(plan_id) for plan_id, count in opening)
+
+    rows = db.session.execute(_scoped(select(
+        DailyRollup.day, DailyRollup.plan_id, func.sum(DailyRollup.new_orders),
+        func.sum(DailyRollup.billed_orders), func.sum(DailyRollup.started), func.sum(DailyRollup.ended)
+    ).where(DailyRollup.day >= start, DailyRollup.day <= today).group_by(
+        DailyRollup.day, DailyRollup.plan_id
+    ), seller_id))
+    by_month = defaultdict(list)
+    for row in rows:
+        by_month[(row[0].year, row[0].month)].append(row[1:])
+
+    result = []
+    for offset in range(months):
+        index = start.year * 12 + start.month - 1 + offset
+        month = date(index // 12, index % 12 + 1, 1)
+        opening_active = active
+        new_orders = revenue = expired = 0
+        for plan_id, created, billed, started, ended in by_month.get((month.year, month.month), ()):
+            new_orders += created
+            revenue += billed * _price(plan_id)
+            expired += ended
+            active += started - ended
+            mrr += (started - ended) * _monthly_price(plan_id)
+        result.append({
+            'month': month,
+            'new_orders': new_orders,
+            'revenue': revenue,
+            'expired': expired,
+            'active': active,
+            'mrr': mrr,
+            'churn': expired / opening_active if opening_active else None,
+        })
+    return result
+
+
+def revenue_breakdown(seller_id=None, months=TREND_MONTHS, today=None):
+    """Revenue over the last `months` months by plan and, across all sellers, by seller.
+
+    Returns {'plans': [...], 'sellers': [...]}, each sorted by revenue; the
+    seller list holds the TOP_SELLERS best and is empty for a single seller.
+    """
+    today = today or date.today()
+    query = select(
+        DailyRollup.seller_id, DailyRollup.plan_id, func.sum(DailyRollup.billed_orders)
+    ).where(DailyRollup.day >= _window(months, today), DailyRollup.day <= today).group_by(
+        DailyRollup.seller_id, DailyRollup.plan_id
+    )
+    if seller_id is not None:
+        query = query.where(DailyRollup.seller_id == seller_id)
+    # Plans come from the scope's own rows (all-sellers for the admin), sellers from the rest
+    scope = ALL_SELLERS if seller_id is None else seller_id
+    plans, sellers = [], Tally()
+    for row_seller_id, plan_id, billed in db.session.execute(query):
+        revenue = billed * _price(plan_id)
+        if row_seller_id == scope:
+            plans.append({'plan_id': plan_id, 'orders': billed, 'revenue': revenue})
+        else:
+            sellers[row_seller_id] += revenue
+    plans.sort(key=lambda item: -item['revenue'])
+
+    top = sellers.most_common(TOP_SELLERS)
+    names = dict(db.session.query(User.id, User.username).filter(
+        User.id.in_([row_seller_id for row_seller_id, _ in top])
+    )) if top else {}
+    return {'plans': plans,
+            'sellers': [{'seller_id': row_seller_id, 'username': names.get(row_seller_id), 'revenue': revenue}
+                        for row_seller_id, revenue in top]}
+
+
+def init_app(app):
+    for name, listener in (('before_flush', _before_flush), ('after_flush', _after_flush)):
+        if not event.contains(db.session, name, listener):
+            event.listen(db.session, name, listener)
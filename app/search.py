@@ -0,0 +1,124 @@
+"""Full-text customer search.
+
+On SQLite the index is an external-content FTS5 table, `customers_fts`, over
+customers.name/email/phone. Triggers keep it in sync, so bulk Core inserts
+are covered as well as ORM writes. On PostgreSQL it is a GIN index on a
+tsvector expression. Search terms are split into words and matched as
+prefixes ("jo smi" finds "John Smith"), best matches first.
+
+Other databases fall back to LIKE matching.
+"""
+import re
+from sqlalchemy import DDL, column, event, func, literal_column, or_, select, table
+from app import db
+from app.models import Customer
+
+SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS customers_fts USING fts5(
+        name, email, phone, content='customers', content_rowid='id'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS customers_fts_ai AFTER INSERT ON customers BEGIN
+        INSERT INTO customers_fts(rowid, name, email, phone)
+        VALUES (new.id, new.name, new.email, new.phone);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS customers_fts_ad AFTER DELETE ON customers BEGIN
+        INSERT INTO customers_fts(customers_fts, rowid, name, email, phone)
+        VALUES ('delete', old.id, old.name, old.email, old.phone);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS customers_fts_au AFTER UPDATE OF name, email, phone ON customers BEGIN
+        INSERT INTO customers_fts(customers_fts, rowid, name, email, phone)
+        VALUES ('delete', old.id, old.name, old.email, old.phone);
+        INSERT INTO customers_fts(rowid, name, email, phone)
+        VALUES (new.id, new.name, new.email, new.phone);
+    END""",
+]
+
+PG_VECTOR = ("to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(email, '') "
+             "|| ' ' || coalesce(phone, ''))")
+POSTGRES_DDL = [
+    f'CREATE INDEX IF NOT EXISTS ix_customers_search ON customers USING gin ({PG_VECTOR})',
+]
+
+_fts = table('customers_fts', column('rowid'))
+
+
+def _terms(text):
+    return re.findall(r'\w+', (text or '').lower())
+
+
+def has_index():
+    return db.engine.dialect.name in ('sqlite', 'postgresql')
+
+
+def match_subquery(text):
+    """Subquery of (customer_id, rank) for customers matching `text`.
+
+    Lower rank is a better match. Returns None when the database has no
+    full-text index or the text has no searchable words, so callers can
+    fall back to LIKE matching.
+    """
+    terms = _terms(text)
+    if not terms or not has_index():
+        return None
+    dialect = db.engine.dialect.name
+
+    if dialect == 'sqlite':
+        query = ' '.join(f'"{term}"*' for term in terms)
+        stmt = select(
+            _fts.c.rowid.label('customer_id'),
+            func.bm25(literal_column('customers_fts')).label('rank')
+        ).where(literal_column('customers_fts').op('MATCH')(query))
+    else:
+        vector = literal_column(PG_VECTOR)
+        tsquery = func.to_tsquery('simple', ' & '.join(f'{term}:*' for term in terms))
+        stmt = select(
+            Customer.id.label('customer_id'),
+            (-func.ts_rank(vector, tsquery)).label('rank')
+        ).where(vector.op('@@')(tsquery))
+    return stmt.subquery('search_hits')
+
+
+def search_customers(text, seller_id=None, limit=20, offset=0):
+    """Ranked (id, name, email) rows for customers matching `text`"""
+    query = db.session.query(Customer.id, Customer.name, Customer.email)
+    if seller_id:
+        query = query.filter(Customer.seller_id == seller_id)
+
+    if not text:
+        # No search yet: just page through the customers in id order
+        return query.order_by(Customer.id).offset(offset).limit(limit).all()
+
+    hits = match_subquery(text)
+    if hits is not None:
+        query = query.join(hits, hits.c.customer_id == Customer.id).order_by(hits.c.rank, Customer.id)
+    elif has_index():
+        # Nothing searchable in the text (only punctuation)
+        return []
+    else:
+        pattern = f'%{text}%'
+        query = query.filter(or_(Customer.name.ilike(pattern), Customer.email.ilike(pattern),
+                                 Customer.phone.ilike(pattern))).order_by(Customer.name, Customer.id)
+    return query.offset(offset).limit(limit).all()
+
+
+def rebuild():
+    """Create the index if missing and repopulate it from the customers table"""
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        for statement in SQLITE_DDL:
+            db.session.execute(db.text(statement))
+        db.session.execute(db.text("INSERT INTO customers_fts(customers_fts) VALUES ('rebuild')"))
+    elif dialect == 'postgresql':
+        for statement in POSTGRES_DDL:
+            db.session.execute(db.text(statement))
+        db.session.execute(db.text('REINDEX INDEX ix_customers_search'))
+    db.session.commit()
+
+
+# Create the index alongside the customers table in db.create_all()
+for statement in SQLITE_DDL:
+    event.listen(Customer.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+for statement in POSTGRES_DDL:
+    event.listen(Customer.__table__, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+event.listen(Customer.__table__, 'before_drop',
+             DDL('DROP TABLE IF EXISTS customers_fts').execute_if(dialect='sqlite'))
@@ -1,63 +1,66 @@
-from flask import render_template, redirect, url_for, flash, request
+from datetime import datetime, time
+from flask import render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required, current_user
-from app import db
-from app.models import Customer, Order, SubscriptionPlan
+from markupsafe import Markup
+from app import db, counters, rollups
+from app.cache import cache, seller_namespace
+from app.models import Customer, Order, MAX_ID
+from app.catalog import all_plans
 from . import bp
 from app.decorators import seller_required
+from app.conditional import conditional
+from app.queries import (seller_order_listing, seller_customer_listing, order_listing_version,
+                         customer_listing_version)
+from app.search import search_customers
 
 @bp.route('/dashboard')
 @login_required
 @seller_required
 def dashboard():
-    # Get counts for the current seller
-    customer_count = Customer.query.filter_by(seller_id=current_user.id).count()
-    order_count = Order.query.join(
-        Customer, Order.customer_id == Customer.id
-    ).filter(
-        Customer.seller_id == current_user.id
-    ).count()
+    # Get counts for the current seller from the materialized counters
+    customer_key = counters.seller_key(current_user.id, counters.CUSTOMERS)
+    order_key = counters.seller_key(current_user.id, counters.ORDERS)
+    namespace = seller_namespace(current_user.id)
+    counts = cache.get_or_set(namespace, 'seller.dashboard.counts',
+                              lambda: counters.get_counts([customer_key, order_key]))
+    customer_count = counts[customer_key]
+    order_count = counts[order_key]
     
-    # Get recent orders for the current seller
-    recent_orders = db.session.query(
-        Order, Customer.name.label('customer_name'), SubscriptionPlan.name.label('plan_name')
-    ).join(
-        Customer, Order.customer_id == Customer.id
-    ).join(
-        SubscriptionPlan, Order.plan_id == SubscriptionPlan.id
-    ).filter(
-        Customer.seller_id == current_user.id
-    ).order_by(Order.created_at.desc()).limit(5).all()
+    # The recent-orders table is cached until one of this seller's orders or customers changes
+    recent_orders = cache.get_or_set(namespace, 'seller.dashboard.recent_orders', lambda: Markup(render_template(
+        'seller/_recent_orders.html',
+        recent_orders=seller_order_listing(current_user.id).order_by(Order.created_at.desc()).limit(5).all())))
+    
+    analytics = cache.get_or_set(namespace, 'seller.dashboard.analytics', lambda: Markup(render_template(
+        'seller/_analytics.html',
+        trend=rollups.trend(current_user.id),
+        breakdown=rollups.revenue_breakdown(current_user.id))))
     
     return render_template('seller/dashboard.html',
                          title='Seller Dashboard',
                          customer_count=customer_count,
                          order_count=order_count,
-                         recent_orders=recent_orders)
+                         recent_orders=recent_orders,
+                         analytics=analytics)
 
 @bp.route('/customers')
 @login_required
 @seller_required
+@conditional(lambda: customer_listing_version(request.args.get('search', '').strip(), current_user.id))
 def customers():
-    seller_customers = Customer.query.filter_by(seller_id=current_user.id).all()
+    search = request.args.get('search', '').strip()
+    seller_customers, orders_by_customer = seller_customer_listing(current_user.id, search=search)
     return render_template('seller/customers.html', 
                          title='My Customers', 
-                         customers=seller_customers)
+                         customers=seller_customers,
+                         orders_by_customer=orders_by_customer)
 
 @bp.route('/orders')
 @login_required
 @seller_required
+@conditional(lambda: order_listing_version({'seller_id': current_user.id}))
 def orders():
-    seller_orders = db.session.query(
-        Order, 
-        Customer.name.label('customer_name'),
-        SubscriptionPlan.name.label('plan_name')
-    ).join(
-        Customer, Order.customer_id == Customer.id
-    ).join(
-        SubscriptionPlan, Order.plan_id == SubscriptionPlan.id
-    ).filter(
-        Customer.seller_id == current_user.id
-    ).order_by(Order.created_at.desc()).all()
+    seller_orders = seller_order_listing(current_user.id).order_by(Order.created_at.desc()).all()
     
     return render_template('seller/orders.html',
                          title='My Orders',
@@ -87,21 +90,39 @@ def add_customer():
                          title='Add Customer',
                          form=form)
 
+@bp.route('/customers/lookup')
+@login_required
+@seller_required
+def customer_lookup():
+    # Typeahead for the order form: a page of (id, name, email) matches
+    query = request.args.get('q', '').strip()
+    per_page = max(1, min(request.args.get('per_page', 20, type=int), 50))
+    # Keep the offset inside a 64-bit integer
+    page = max(1, min(request.args.get('page', 1, type=int), MAX_ID // per_page))
+    
+    rows = search_customers(query, seller_id=current_user.id,
+                            limit=per_page + 1, offset=(page - 1) * per_page)
+    return jsonify({
+        'results': [{'id': id, 'name': name, 'email': email} for id, name, email in rows[:per_page]],
+        'page': page,
+        'has_more': len(rows) > per_page
+    })
+
 @bp.route('/order/create', methods=['GET', 'POST'])
 @login_required
 @seller_required
 def create_order():
     from app.forms import OrderForm
     
-    form = OrderForm()
-    # Filter customers to only show those belonging to the current seller
-    form.customer_id.choices = [(c.id, c.name) for c in Customer.query.filter_by(seller_id=current_user.id).all()]
+    form = OrderForm(seller_id=current_user.id)
+    plans = all_plans()
+    form.plan_id.choices = [(plan.id, plan.name) for plan in plans]
     
     if form.validate_on_submit():
         order = Order(
             customer_id=form.customer_id.data,
             plan_id=form.plan_id.data,
-            start_date=form.start_date.data,
+            start_date=datetime.combine(form.start_date.data, time()),
             status='Active',
             created_by=current_user.id
         )
@@ -111,6 +132,15 @@ def create_order():
         flash('Order created successfully!', 'success')
         return redirect(url_for('seller.orders'))
     
+    # Re-rendering after a failed POST: keep the chosen customer selected
+    selected_customer = None
+    if form.customer_id.data and not form.customer_id.errors:
+        selected_customer = db.session.query(Customer.id, Customer.name, Customer.email).filter_by(
+            id=form.customer_id.data, seller_id=current_user.id
+        ).first()
+    
     return render_template('seller/create_order.html',
                          title='Create Order',
-                         form=form)
+                         form=form,
+                         plans=plans,
+                         selected_customer=selected_customer)
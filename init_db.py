@@ -1,23 +1,14 @@
+import os
 from app import create_app, db
+from app.bootstrap import bootstrap
 from app.models import User, Customer, SubscriptionPlan, Order
 from datetime import datetime, timedelta, timezone
 
 def init_db():
     app = create_app()
     with app.app_context():
-        # Create database tables
-        db.create_all()
-        
-        # Create default admin user if not exists
-        admin = User.query.filter_by(username='admin').first()
-        if not admin:
-            admin = User(
-                username='admin',
-                email='admin@example.com',
-                role='admin'
-            )
-            admin.set_password('admin123')
-            db.session.add(admin)
+        # Upgrade the schema and create the admin user (same as `flask bootstrap`)
+        bootstrap(app)
         
         # Create a test seller
         seller = User(
@@ -38,7 +29,7 @@ def init_db():
         print("Database initialized successfully!")
         print("Admin credentials:")
         print(f"Username: admin")
-        print(f"Password: admin123")
+        print(f"Password: {os.getenv('DEFAULT_ADMIN_PASSWORD', 'admin123')}")
         print("\nTest seller credentials:")
         print(f"Username: testseller")
         print(f"Password: seller123")
@@ -0,0 +1,47 @@
+"""counters table and indexes for the hot query shapes
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 09:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_users_role_username', 'users', ['role', 'username']),
+    ('ix_customers_seller_id_id', 'customers', ['seller_id', 'id']),
+    ('ix_orders_status_end_date', 'orders', ['status', 'end_date']),
+    ('ix_orders_created_at_id', 'orders', ['created_at', 'id']),
+    ('ix_orders_customer_id_created_at', 'orders', ['customer_id', 'created_at']),
+    ('ix_orders_created_by_created_at', 'orders', ['created_by', 'created_at']),
+]
+
+
+def upgrade():
+    # Databases bootstrapped with db.create_all() may already have some of these
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('counters'):
+        op.create_table('counters',
+        sa.Column('key', sa.String(length=64), nullable=False),
+        sa.Column('value', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('key')
+        )
+
+    for name, table, columns in INDEXES:
+        existing = {index['name'] for index in inspector.get_indexes(table)}
+        if name not in existing:
+            op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
+    op.drop_table('counters')
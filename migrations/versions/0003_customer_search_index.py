@@ -0,0 +1,66 @@
+"""full-text search index on customers
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+# Kept in step with SQLITE_DDL / POSTGRES_DDL in app/search.py
+SQLITE_UPGRADE = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS customers_fts USING fts5(
+        name, email, phone, content='customers', content_rowid='id'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS customers_fts_ai AFTER INSERT ON customers BEGIN
+        INSERT INTO customers_fts(rowid, name, email, phone)
+        VALUES (new.id, new.name, new.email, new.phone);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS customers_fts_ad AFTER DELETE ON customers BEGIN
+        INSERT INTO customers_fts(customers_fts, rowid, name, email, phone)
+        VALUES ('delete', old.id, old.name, old.email, old.phone);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS customers_fts_au AFTER UPDATE OF name, email, phone ON customers BEGIN
+        INSERT INTO customers_fts(customers_fts, rowid, name, email, phone)
+        VALUES ('delete', old.id, old.name, old.email, old.phone);
+        INSERT INTO customers_fts(rowid, name, email, phone)
+        VALUES (new.id, new.name, new.email, new.phone);
+    END""",
+    "INSERT INTO customers_fts(customers_fts) VALUES ('rebuild')",
+]
+SQLITE_DOWNGRADE = [
+    'DROP TRIGGER IF EXISTS customers_fts_au',
+    'DROP TRIGGER IF EXISTS customers_fts_ad',
+    'DROP TRIGGER IF EXISTS customers_fts_ai',
+    'DROP TABLE IF EXISTS customers_fts',
+]
+POSTGRES_UPGRADE = [
+    "CREATE INDEX IF NOT EXISTS ix_customers_search ON customers USING gin "
+    "(to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(email, '') || ' ' || coalesce(phone, '')))",
+]
+POSTGRES_DOWNGRADE = [
+    'DROP INDEX IF EXISTS ix_customers_search',
+]
+
+
+def _run(sqlite_statements, postgres_statements):
+    dialect = op.get_bind().dialect.name
+    statements = {'sqlite': sqlite_statements, 'postgresql': postgres_statements}.get(dialect, [])
+    for statement in statements:
+        op.execute(sa.text(statement))
+
+
+def upgrade():
+    _run(SQLITE_UPGRADE, POSTGRES_UPGRADE)
+
+
+def downgrade():
+    _run(SQLITE_DOWNGRADE, POSTGRES_DOWNGRADE)
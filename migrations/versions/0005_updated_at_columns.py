@@ -0,0 +1,38 @@
+"""updated_at on customers and orders for conditional GETs
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('customers', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_customers_updated_at', ['updated_at'], unique=False)
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_orders_updated_at', ['updated_at'], unique=False)
+
+    # Existing rows: customers have no creation time, orders start from theirs
+    op.execute('UPDATE customers SET updated_at = CURRENT_TIMESTAMP')
+    op.execute('UPDATE orders SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP)')
+
+
+def downgrade():
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.drop_index('ix_orders_updated_at')
+        batch_op.drop_column('updated_at')
+    with op.batch_alter_table('customers', schema=None) as batch_op:
+        batch_op.drop_index('ix_customers_updated_at')
+        batch_op.drop_column('updated_at')
@@ -0,0 +1,36 @@
+"""daily_rollups table for the revenue and subscription analytics
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Filled by `flask rollups rebuild`, then kept current by order writes
+    op.create_table('daily_rollups',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('seller_id', sa.Integer(), nullable=False),
+    sa.Column('plan_id', sa.Integer(), nullable=False),
+    sa.Column('new_orders', sa.Integer(), nullable=False),
+    sa.Column('billed_orders', sa.Integer(), nullable=False),
+    sa.Column('started', sa.Integer(), nullable=False),
+    sa.Column('ended', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'seller_id', 'plan_id')
+    )
+    op.create_index('ix_daily_rollups_seller_id_day', 'daily_rollups', ['seller_id', 'day'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_daily_rollups_seller_id_day', table_name='daily_rollups')
+    op.drop_table('daily_rollups')
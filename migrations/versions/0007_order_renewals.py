@@ -0,0 +1,34 @@
+"""renewal columns and indexes on orders
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('renewed_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('renewed_from_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_orders_renewed_from_id_orders', 'orders', ['renewed_from_id'], ['id'])
+        batch_op.create_index('ix_orders_renewed_at_end_date', ['renewed_at', 'end_date', 'id'], unique=False)
+        batch_op.create_index('ix_orders_renewed_from_id', ['renewed_from_id'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.drop_index('ix_orders_renewed_from_id')
+        batch_op.drop_index('ix_orders_renewed_at_end_date')
+        batch_op.drop_constraint('fk_orders_renewed_from_id_orders', type_='foreignkey')
+        batch_op.drop_column('renewed_from_id')
+        batch_op.drop_column('renewed_at')
@@ -0,0 +1,24 @@
+"""case-insensitive index on customers.email for the import duplicate check
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_customers_email_lower', 'customers', [sa.text('lower(email)')], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_customers_email_lower', table_name='customers')
@@ -0,0 +1,60 @@
+import pytest
+from app import create_app, db
+from app.bootstrap import bootstrap
+from app.catalog import catalog
+from app.models import User, Customer, SubscriptionPlan
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    # A throwaway SQLite database brought up through the migrations, with
+    # cheap password hashes and no replica, Redis cache or perf log
+    monkeypatch.setenv('DATABASE_URL', f'sqlite:///{tmp_path / "test.db"}')
+    monkeypatch.setenv('JOBS_DIR', str(tmp_path / 'jobs'))
+    monkeypatch.setenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:1000')
+    monkeypatch.setenv('PERF_LOG', '0')
+    for name in ('DATABASE_REPLICA_URL', 'CACHE_URL'):
+        monkeypatch.delenv(name, raising=False)
+
+    app = create_app()
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with app.app_context():
+        bootstrap(app, admin_password='admin123')
+        catalog.invalidate()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def data(app):
+    """Two sellers with a customer each, and a 30-day and a 365-day plan"""
+    sellers = []
+    for name in ('alice', 'bob'):
+        seller = User(username=name, email=f'{name}@example.com', role='seller')
+        seller.set_password('seller123')
+        seller.customers.append(Customer(name=f'{name.title()} Customer', email=f'{name}-customer@example.com'))
+        sellers.append(seller)
+    plans = [SubscriptionPlan(name='Monthly', price=9.99, duration_days=30),
+             SubscriptionPlan(name='Yearly', price=99.0, duration_days=365)]
+    db.session.add_all(sellers + plans)
+    db.session.commit()
+    return {
+        'seller': sellers[0].id,
+        'customer': sellers[0].customers[0].id,
+        'other_customer': sellers[1].customers[0].id,
+        'plan': plans[0].id,
+        'yearly_plan': plans[1].id,
+    }
+
+
+@pytest.fixture
+def auth(client, data):
+    response = client.post('/api/v1/tokens', json={'email': 'alice@example.com', 'password': 'seller123'})
+    assert response.status_code == 201
+    return {'Authorization': f'Bearer {response.json["token"]}'}
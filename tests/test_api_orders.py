@@ -0,0 +1,134 @@
+"""POST /api/v1/orders: per-item validation and the single-transaction write."""
+import pytest
+from sqlalchemy import event
+from app import db, counters
+from app.models import Order
+
+
+def post_orders(client, auth, orders, **extra):
+    return client.post('/api/v1/orders', json={'orders': orders, **extra}, headers=auth)
+
+
+def order_count():
+    return db.session.query(Order).count()
+
+
+def test_all_created(client, auth, data):
+    response = post_orders(client, auth, [
+        {'customer_id': data['customer'], 'plan_id': data['plan'], 'start_date': '2024-01-01'},
+        {'customer_id': data['customer'], 'plan_id': data['yearly_plan'], 'status': 'Pending'},
+    ])
+
+    assert response.status_code == 201
+    assert response.json['created'] == 2 and response.json['failed'] == 0
+    first = response.json['results'][0]
+    assert first['status'] == 'created'
+    assert first['end_date'] == '2024-01-31T00:00:00'
+    assert order_count() == 2
+    assert counters.get_counts([counters.ORDERS])[counters.ORDERS] == 2
+
+
+def test_partial_batch(client, auth, data):
+    response = post_orders(client, auth, [
+        {'customer_id': data['customer'], 'plan_id': data['plan']},
+        {'customer_id': data['customer'], 'plan_id': 999},
+    ])
+
+    assert response.status_code == 207
+    results = response.json['results']
+    assert [result['status'] for result in results] == ['created', 'error']
+    assert results[1] == {'index': 1, 'status': 'error', 'error': 'Unknown plan 999'}
+    assert order_count() == 1
+
+
+def test_nothing_created(client, auth, data):
+    response = post_orders(client, auth, [{'customer_id': data['customer']}])
+
+    assert response.status_code == 422
+    assert response.json['created'] == 0
+    assert order_count() == 0
+
+
+@pytest.mark.parametrize('customer_id', [True, False, '1', 1.0, None, 0, -1, 2 ** 63, 2 ** 70])
+def test_rejects_bad_customer_ids(client, auth, data, customer_id):
+    response = post_orders(client, auth, [{'customer_id': customer_id, 'plan_id': data['plan']}])
+
+    assert response.status_code == 422
+    assert response.json['results'][0]['status'] == 'error'
+    assert 'customer_id and plan_id' in response.json['results'][0]['error']
+
+
+@pytest.mark.parametrize('plan_id', [True, -5, 2 ** 70])
+def test_rejects_bad_plan_ids(client, auth, data, plan_id):
+    response = post_orders(client, auth, [{'customer_id': data['customer'], 'plan_id': plan_id}])
+
+    assert response.status_code == 422
+    assert 'customer_id and plan_id' in response.json['results'][0]['error']
+
+
+def test_bad_id_does_not_fail_the_batch(client, auth, data):
+    response = post_orders(client, auth, [
+        {'customer_id': 2 ** 70, 'plan_id': data['plan']},
+        {'customer_id': data['customer'], 'plan_id': data['plan']},
+    ])
+
+    assert response.status_code == 207
+    assert [result['status'] for result in response.json['results']] == ['error', 'created']
+
+
+def test_end_date_overflow_is_an_item_error(client, auth, data):
+    response = post_orders(client, auth, [
+        {'customer_id': data['customer'], 'plan_id': data['yearly_plan'], 'start_date': '9999-12-30'},
+        {'customer_id': data['customer'], 'plan_id': data['plan']},
+    ])
+
+    assert response.status_code == 207
+    results = response.json['results']
+    assert results[0]['status'] == 'error' and 'too far in the future' in results[0]['error']
+    assert results[1]['status'] == 'created'
+
+
+def test_other_sellers_customer_is_unknown(client, auth, data):
+    response = post_orders(client, auth, [{'customer_id': data['other_customer'], 'plan_id': data['plan']}])
+
+    assert response.status_code == 422
+    assert response.json['results'][0]['error'] == f'Unknown customer {data["other_customer"]}'
+    assert order_count() == 0
+
+
+def test_all_or_nothing_skips_the_rest(client, auth, data):
+    response = post_orders(client, auth, [
+        {'customer_id': data['customer'], 'plan_id': data['plan']},
+        {'customer_id': data['other_customer'], 'plan_id': data['plan']},
+    ], all_or_nothing=True)
+
+    assert response.status_code == 422
+    assert [result['status'] for result in response.json['results']] == ['skipped', 'error']
+    assert order_count() == 0
+
+
+def test_batch_is_one_transaction(client, auth, data):
+    commits = []
+    def on_commit(connection):
+        commits.append(connection)
+
+    event.listen(db.engine, 'commit', on_commit)
+    try:
+        response = post_orders(client, auth, [
+            {'customer_id': data['customer'], 'plan_id': data['plan']} for _ in range(50)
+        ])
+    finally:
+        event.remove(db.engine, 'commit', on_commit)
+
+    assert response.status_code == 201
+    assert len(commits) == 1
+    assert order_count() == 50
+    assert counters.get_counts([counters.seller_key(data['seller'], counters.ORDERS)]) == {
+        counters.seller_key(data['seller'], counters.ORDERS): 50}
+
+
+def test_requires_a_seller_token(client, data):
+    response = post_orders(client, {}, [{'customer_id': data['customer'], 'plan_id': data['plan']}])
+
+    assert response.status_code == 401
+    assert order_count() == 0